@@ -1,11 +1,18 @@
 """
 Flask Application Factory
 """
-from flask import Flask, jsonify
+import uuid
+
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from app.core.config import get_config
 from app.core.exceptions import VectorStoreError, ChatServiceError
-from app.utils.logger import setup_logger
+from app.services.admission import AdmissionController
+from app.services.journal import RequestJournal
+from app.services.session_store import load_session_store
+from app.utils.logger import request_id_var, setup_logger
+from app.utils.serialization import FastJSONProvider, gzip_response
 
 logger = setup_logger(__name__)
 
@@ -21,20 +28,65 @@ def create_app(config_name='development'):
         Flask application instance
     """
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     
     # Load configuration
     config = get_config(config_name)
     app.config.from_object(config)
     
+    # Take the client address from X-Forwarded-For set by trusted proxies
+    if app.config.get('TRUSTED_PROXY_HOPS'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'])
+    
     # Initialize CORS
     CORS(app, resources={
         r"/*": {
             "origins": app.config.get('CORS_ORIGINS', '*'),
             "methods": ["GET", "POST", "PUT", "DELETE"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "X-API-Key", "X-Priority", "X-Request-ID"]
         }
     })
     
+    # Tag every request (and its log records) with a request id
+    @app.before_request
+    def assign_request_id():
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_id_token = request_id_var.set(request_id)
+    
+    @app.after_request
+    def add_request_id_header(response):
+        response.headers['X-Request-ID'] = request_id_var.get()
+        return response
+    
+    @app.teardown_request
+    def clear_request_id(exc=None):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
+    
+    # Compress large JSON responses (search results, batch answers)
+    if app.config.get('GZIP_ENABLED'):
+        @app.after_request
+        def compress_response(response):
+            return gzip_response(
+                response,
+                request.accept_encodings['gzip'] > 0,
+                min_bytes=app.config['GZIP_MIN_BYTES'],
+                level=app.config['GZIP_LEVEL']
+            )
+    
+    # Initialize admission control for the chat routes
+    if app.config.get('RATE_LIMIT_ENABLED'):
+        app.extensions['admission'] = AdmissionController.from_config(app.config)
+    
+    # Initialize conversation history for session-aware chat
+    if app.config.get('SESSIONS_ENABLED'):
+        app.extensions['sessions'] = load_session_store(app.config)
+    
+    # Record /chat traffic for replay (python -m app.replay)
+    if app.config.get('JOURNAL_ENABLED'):
+        app.extensions['journal'] = RequestJournal.from_config(app.config)
+    
     # Register blueprints
     from app.routes.health import health_bp
     from app.routes.chat import chat_bp
@@ -45,12 +97,12 @@ def create_app(config_name='development'):
     # Error handlers
     @app.errorhandler(VectorStoreError)
     def handle_vectorstore_error(error):
-        logger.error(f"VectorStore error: {str(error)}")
+        logger.error("VectorStore error: %s", error)
         return jsonify({"error": str(error)}), 500
     
     @app.errorhandler(ChatServiceError)
     def handle_chat_service_error(error):
-        logger.error(f"ChatService error: {str(error)}")
+        logger.error("ChatService error: %s", error)
         return jsonify({"error": str(error)}), 500
     
     @app.errorhandler(404)
@@ -59,9 +111,9 @@ def create_app(config_name='development'):
     
     @app.errorhandler(500)
     def internal_error(error):
-        logger.error(f"Internal server error: {str(error)}")
+        logger.error("Internal server error: %s", error)
         return jsonify({"error": "Internal server error"}), 500
     
-    logger.info(f"Application initialized with {config_name} configuration")
+    logger.info("Application initialized with %s configuration", config_name)
     
     return app
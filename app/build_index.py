@@ -0,0 +1,91 @@
+"""
+Offline Index Builder
+
+Builds a collection's FAISS index outside the web process. Embeddings are
+checkpointed per batch, so re-running after an interruption resumes where
+the previous run stopped. The finished index replaces VECTOR_DIR in one
+step; a running pre-fork server picks it up on SIGHUP.
+
+Usage:
+    python -m app.build_index [--collection NAME | --all] [--batch-size N] [--fresh]
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+
+from app.core.config import get_collection_config, load_collections
+from app.core.exceptions import VectorStoreError
+from app.services.vector_service import CHECKPOINT_SUFFIX, VectorStoreService
+from app.utils.logger import setup_logger, stop_logging
+
+logger = setup_logger(__name__)
+
+
+def build(config_name: str, collection=None, batch_size=None, fresh=False) -> dict:
+    """
+    Build one collection's index.
+
+    Args:
+        config_name: Configuration environment
+        collection: Collection name (None for the default collection)
+        batch_size: Chunks per embedding request (default EMBED_BATCH_SIZE)
+        fresh: Discard any checkpoint from an earlier run
+
+    Returns:
+        Build report, including per-stage timings
+
+    Raises:
+        VectorStoreError: If the build fails
+    """
+    service = VectorStoreService(config_name, collection)
+    if fresh:
+        shutil.rmtree(service.config.VECTOR_DIR + CHECKPOINT_SUFFIX, ignore_errors=True)
+
+    started = time.perf_counter()
+    service.build_vectorstore(batch_size=batch_size)
+    report = dict(service.last_build_report)
+    report["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def main(argv=None) -> int:
+    """Entry point for ``python -m app.build_index``"""
+    parser = argparse.ArgumentParser(description="Build FAISS indexes offline")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--collection', help="Collection to build (default collection if omitted)")
+    target.add_argument('--all', action='store_true', help="Build every configured collection")
+    parser.add_argument('--batch-size', type=int, help="Chunks per embedding request")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Ignore checkpoints from an interrupted build")
+    args = parser.parse_args(argv)
+
+    config_name = os.getenv('FLASK_ENV', 'development')
+    if args.all:
+        collections = list(load_collections(get_collection_config(config_name)))
+    else:
+        collections = [args.collection]
+
+    exit_code = 0
+    for collection in collections:
+        name = collection or get_collection_config(config_name).DEFAULT_COLLECTION
+        try:
+            report = build(config_name, collection, args.batch_size, args.fresh)
+        except (KeyError, VectorStoreError) as e:
+            logger.error("Build of collection %s failed: %s", name, e)
+            exit_code = 1
+            continue
+
+        logger.info("Collection %s: %s chunks (%s resumed from checkpoint)",
+                    name, report.get("chunks"), report.get("chunks_resumed", 0))
+        for stage, value in report.get("timings_ms", {}).items():
+            logger.info("  %-10s %10.1f ms", stage, value)
+        logger.info("  %-10s %10.1f ms", "total_ms", report["total_ms"])
+
+    stop_logging()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
 """
 Configuration Management
 """
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -23,10 +24,22 @@ class Config:
     # CORS settings
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
     
+    # Request/response limits and compression of large JSON responses
+    BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', 32))
+    SEARCH_MAX_K = int(os.getenv('SEARCH_MAX_K', 50))
+    GZIP_ENABLED = os.getenv('GZIP_ENABLED', 'true').lower() == 'true'
+    GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', 1024))
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 5))
+    
     # Data paths
     DATA_DIR = os.path.join(BASE_DIR, 'data')
     VECTOR_DIR = os.path.join(BASE_DIR, 'faiss_index')
     
+    # Collections (named corpora; see load_collections)
+    DEFAULT_COLLECTION = os.getenv('DEFAULT_COLLECTION', 'default')
+    COLLECTIONS_FILE = os.getenv('COLLECTIONS_FILE', '')
+    COLLECTION_MEMORY_BUDGET_MB = float(os.getenv('COLLECTION_MEMORY_BUDGET_MB', 1024))
+    
     # AI Model settings
     CHAT_MODEL = os.getenv('CHAT_MODEL', 'llama3.2:1b')
     EMBED_MODEL = os.getenv('EMBED_MODEL', 'nomic-embed-text')
@@ -34,16 +47,135 @@ class Config:
     # Ollama settings
     OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
     
+    # Backend pool settings (comma-separated URLs, defaults to OLLAMA_BASE_URL)
+    OLLAMA_BASE_URLS = [
+        url.strip()
+        for url in os.getenv('OLLAMA_BASE_URLS', OLLAMA_BASE_URL).split(',')
+        if url.strip()
+    ]
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv('OLLAMA_MAX_CONCURRENCY', 4))
+    OLLAMA_FAILURE_THRESHOLD = int(os.getenv('OLLAMA_FAILURE_THRESHOLD', 3))
+    OLLAMA_EJECT_SECONDS = float(os.getenv('OLLAMA_EJECT_SECONDS', 30))
+    OLLAMA_ACQUIRE_TIMEOUT = float(os.getenv('OLLAMA_ACQUIRE_TIMEOUT', 60))
+    
+    # HTTP client settings for Ollama connections
+    OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', 10))
+    OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv('OLLAMA_KEEPALIVE_EXPIRY', 300))
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', 2))
+    OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', 120))
+    OLLAMA_RETRY_RATIO = float(os.getenv('OLLAMA_RETRY_RATIO', 0.1))
+    OLLAMA_RETRY_RESERVE = int(os.getenv('OLLAMA_RETRY_RESERVE', 3))
+    
     # LangChain settings
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))
+    CHUNK_STRATEGY = os.getenv('CHUNK_STRATEGY', 'structure')
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+    DEDUP_MAX_DISTANCE = int(os.getenv('DEDUP_MAX_DISTANCE', 3))
     RETRIEVER_K = int(os.getenv('RETRIEVER_K', 4))
+    
+    # Conversation sessions (history kept per session_id)
+    SESSIONS_ENABLED = os.getenv('SESSIONS_ENABLED', 'true').lower() == 'true'
+    SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', 1800))
+    SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', 10000))
+    SESSION_MEMORY_MB = float(os.getenv('SESSION_MEMORY_MB', 64))
+    SESSION_MAX_TURNS = int(os.getenv('SESSION_MAX_TURNS', 6))
+    SESSION_HISTORY_TOKENS = int(os.getenv('SESSION_HISTORY_TOKENS', 400))
+    SESSION_ANSWER_CHARS = int(os.getenv('SESSION_ANSWER_CHARS', 400))
+    # Shared session backend ('module:Class', see SessionBackend); in-memory if empty
+    SESSION_STORE = os.getenv('SESSION_STORE', '')
+    
+    # Re-ranking: fetch RERANK_FETCH_K chunks, send the best RERANK_TOP_N to the LLM
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+    RERANK_FETCH_K = int(os.getenv('RERANK_FETCH_K', 8))
+    RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', 2))
+    RERANK_WEIGHT = float(os.getenv('RERANK_WEIGHT', 0.5))
+    RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', 10000))
+    
+    # Index building: batch size for embedding requests, and whether the web
+    # process may build a missing index itself (disable to require the CLI)
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 32))
+    INDEX_BUILD_ON_DEMAND = os.getenv('INDEX_BUILD_ON_DEMAND', 'true').lower() == 'true'
+    
+    # Re-index collections in the background when DATA_DIR changes
+    INDEX_WATCH_ENABLED = os.getenv('INDEX_WATCH_ENABLED', 'false').lower() == 'true'
+    INDEX_WATCH_DEBOUNCE = float(os.getenv('INDEX_WATCH_DEBOUNCE', 5))
+    INDEX_WATCH_POLL_INTERVAL = float(os.getenv('INDEX_WATCH_POLL_INTERVAL', 10))
+    
+    # Vector index quantization (none, fp16, int8 or pq)
+    INDEX_QUANTIZATION = os.getenv('INDEX_QUANTIZATION', 'none')
+    PQ_M = int(os.getenv('PQ_M', 16))
+    PQ_NBITS = int(os.getenv('PQ_NBITS', 8))
+    QUANTIZATION_RERANK = os.getenv('QUANTIZATION_RERANK', 'true').lower() == 'true'
+    QUANTIZATION_RERANK_FACTOR = int(os.getenv('QUANTIZATION_RERANK_FACTOR', 4))
+    QUANTIZATION_MIN_RECALL = float(os.getenv('QUANTIZATION_MIN_RECALL', 0.9))
+    
     LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', 0.0))
     LLM_NUM_CTX = int(os.getenv('LLM_NUM_CTX', 4096))
     
+    # Adaptive retrieval settings (skip generation for irrelevant queries)
+    RETRIEVAL_MIN_SCORE = float(os.getenv('RETRIEVAL_MIN_SCORE', 0.0))
+    DOMAIN_CLASSIFIER_ENABLED = os.getenv('DOMAIN_CLASSIFIER_ENABLED', 'false').lower() == 'true'
+    DOMAIN_MIN_OVERLAP = float(os.getenv('DOMAIN_MIN_OVERLAP', 0.2))
+    
+    # Model routing: simple queries go to CHAT_MODEL, complex or weakly
+    # matched ones to QUALITY_CHAT_MODEL (on QUALITY_OLLAMA_BASE_URLS)
+    ROUTER_ENABLED = os.getenv('ROUTER_ENABLED', 'false').lower() == 'true'
+    QUALITY_CHAT_MODEL = os.getenv('QUALITY_CHAT_MODEL', 'llama3.1:8b')
+    QUALITY_OLLAMA_BASE_URLS = [
+        url.strip()
+        for url in os.getenv('QUALITY_OLLAMA_BASE_URLS', ','.join(OLLAMA_BASE_URLS)).split(',')
+        if url.strip()
+    ]
+    ROUTER_MIN_TERMS_QUALITY = int(os.getenv('ROUTER_MIN_TERMS_QUALITY', 12))
+    ROUTER_CONFIDENT_SCORE = float(os.getenv('ROUTER_CONFIDENT_SCORE', 0.5))
+    FAST_NUM_PREDICT = int(os.getenv('FAST_NUM_PREDICT', 256))
+    QUALITY_NUM_PREDICT = int(os.getenv('QUALITY_NUM_PREDICT', 512))
+    FAST_LATENCY_BUDGET = float(os.getenv('FAST_LATENCY_BUDGET', 30))
+    QUALITY_LATENCY_BUDGET = float(os.getenv('QUALITY_LATENCY_BUDGET', 90))
+    
+    # Prompt caching settings
+    PROMPT_LAYOUT = os.getenv('PROMPT_LAYOUT', 'prefix_cache')
+    LLM_KEEP_ALIVE = os.getenv('LLM_KEEP_ALIVE', '30m')
+    
+    # Admission control settings
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', 60))
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 10))
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', '')
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted
+    # (0: use the socket address)
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    # X-API-Key values trusted to identify a client (others are limited by IP)
+    RATE_LIMIT_API_KEYS = [
+        key.strip() for key in os.getenv('RATE_LIMIT_API_KEYS', '').split(',') if key.strip()
+    ]
+    MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', 8))
+    MAX_IN_FLIGHT_BATCH = int(os.getenv('MAX_IN_FLIGHT_BATCH', 2))
+    SHED_RETRY_AFTER = int(os.getenv('SHED_RETRY_AFTER', 1))
+    
+    # Pre-fork server settings (0 workers = one per CPU core)
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 0))
+    SERVER_GRACEFUL_TIMEOUT = float(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.path.join(BASE_DIR, 'logs', 'app.log')
+    LOG_QUEUE_ENABLED = os.getenv('LOG_QUEUE_ENABLED', 'true').lower() == 'true'
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    
+    # Request journal for load replay (JSON Lines, written in batches)
+    JOURNAL_ENABLED = os.getenv('JOURNAL_ENABLED', 'false').lower() == 'true'
+    JOURNAL_PATH = os.getenv('JOURNAL_PATH', os.path.join(BASE_DIR, 'logs', 'journal.jsonl'))
+    JOURNAL_BATCH_SIZE = int(os.getenv('JOURNAL_BATCH_SIZE', 100))
+    JOURNAL_FLUSH_INTERVAL = float(os.getenv('JOURNAL_FLUSH_INTERVAL', 1.0))
+    JOURNAL_MAX_BYTES = int(os.getenv('JOURNAL_MAX_BYTES', 50 * 1024 * 1024))
+    JOURNAL_BACKUP_COUNT = int(os.getenv('JOURNAL_BACKUP_COUNT', 5))
+    JOURNAL_QUEUE_SIZE = int(os.getenv('JOURNAL_QUEUE_SIZE', 10000))
 
 
 class DevelopmentConfig(Config):
@@ -75,3 +207,62 @@ config_map = {
 def get_config(config_name='development'):
     """Get configuration object by name"""
     return config_map.get(config_name, DevelopmentConfig)
+
+
+def load_collections(config) -> dict:
+    """
+    Load the named collections served by the API.
+    
+    COLLECTIONS_FILE points to a JSON object mapping collection names to
+    setting overrides, e.g.
+    {"poultry": {"data_dir": "data/poultry", "chunk_size": 800}}.
+    Keys are config attribute names in any case (data_dir, vector_dir,
+    chunk_size, chunk_overlap, embed_model, ...). The default collection
+    uses DATA_DIR/VECTOR_DIR unless overridden in the file.
+    
+    Args:
+        config: Configuration class or instance
+    
+    Returns:
+        Dictionary of collection name -> settings overrides
+    """
+    collections = {config.DEFAULT_COLLECTION: {}}
+    if config.COLLECTIONS_FILE:
+        with open(config.COLLECTIONS_FILE, encoding='utf-8') as f:
+            collections.update(json.load(f))
+    return collections
+
+
+def get_collection_config(config_name='development', collection=None):
+    """
+    Get a configuration instance with a collection's overrides applied.
+    
+    Collections other than the default get their own data and index
+    directories (data/<name>, faiss_index_<name>) unless set explicitly.
+    
+    Args:
+        config_name: Configuration environment
+        collection: Collection name (None for the default collection)
+    
+    Returns:
+        Configuration instance
+    
+    Raises:
+        KeyError: If the collection is not defined
+    """
+    config = get_config(config_name)()
+    name = collection or config.DEFAULT_COLLECTION
+    settings = load_collections(config)[name]
+    
+    if name != config.DEFAULT_COLLECTION:
+        config.DATA_DIR = os.path.join(BASE_DIR, 'data', name)
+        config.VECTOR_DIR = os.path.join(BASE_DIR, f'faiss_index_{name}')
+    for key, value in settings.items():
+        attr = key.upper()
+        if not hasattr(config, attr):
+            raise KeyError(f"Unknown setting '{key}' for collection '{name}'")
+        if attr in ('DATA_DIR', 'VECTOR_DIR'):
+            value = os.path.join(BASE_DIR, value)
+        setattr(config, attr, value)
+    config.COLLECTION = name
+    return config
@@ -3,9 +3,10 @@ Application Constants
 """
 
 
-# System prompt for the dairy farming chatbot
-SYSTEM_PROMPT = """
-You are a Dairy Farmer Advisory Assistant. Answer questions strictly using ONLY the context provided below. Prioritize and extract information based on relevant dairy farming keywords found within the context.
+# Instructions shared by both prompt layouts; {where} says where the
+# context is placed
+_INSTRUCTIONS_TEMPLATE = """
+You are a Dairy Farmer Advisory Assistant. Answer questions strictly using ONLY the context provided {where}. Prioritize and extract information based on relevant dairy farming keywords found within the context.
 
 RULES:
 1. If the context contains information related to the query's keywords, answer clearly in 3-5 bullet points.
@@ -18,15 +19,44 @@ Answer format (when context has info):
 • Key point from context
 • Key point from context
 • Key point from context
+"""
+
+# Static instructions for the prefix-cache prompt layout. Kept free of any
+# per-request text so Ollama can reuse the KV cache for this prefix.
+SYSTEM_INSTRUCTIONS = _INSTRUCTIONS_TEMPLATE.format(where="in the next message")
 
-CONTEXT:
+# Per-request context message, placed after SYSTEM_INSTRUCTIONS
+CONTEXT_PROMPT = """CONTEXT:
 {context}
 """
 
+# System prompt for the dairy farming chatbot (legacy layout: the context
+# is part of the system prompt)
+SYSTEM_PROMPT = _INSTRUCTIONS_TEMPLATE.format(where="below") + "\n" + CONTEXT_PROMPT
+
+# Prompt layouts supported by ChatService
+PROMPT_LAYOUT_LEGACY = 'legacy'
+PROMPT_LAYOUT_PREFIX_CACHE = 'prefix_cache'
+PROMPT_LAYOUTS = (PROMPT_LAYOUT_LEGACY, PROMPT_LAYOUT_PREFIX_CACHE)
+
+# Vector index quantization modes
+QUANTIZATION_NONE = 'none'
+QUANTIZATION_FP16 = 'fp16'
+QUANTIZATION_INT8 = 'int8'
+QUANTIZATION_PQ = 'pq'
+
+# Canned responses returned without calling the LLM (same wording as the prompt rules)
+MSG_OUT_OF_DOMAIN = "I cannot answer this as I am only trained for dairy farming queries."
+MSG_NO_INFORMATION = "I don't have information about this in my database."
+
 # Supported document file extensions
 SUPPORTED_EXTENSIONS = ['.docx', '.doc']
 
 # API Response messages
 MSG_INDEX_REBUILT = "Index rebuilt from DOCX files"
+MSG_REBUILD_DISABLED = "Index building is disabled on this server; use python -m app.build_index"
 MSG_QUERY_REQUIRED = "Field 'query' is required"
+MSG_INVALID_SESSION = "Field 'session_id' must be a string of at most 128 characters"
 MSG_HEALTH_OK = "Chatbot backend running"
+MSG_RATE_LIMITED = "Rate limit exceeded, please retry later"
+MSG_OVERLOADED = "Server is busy, please retry later"
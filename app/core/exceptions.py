@@ -21,3 +21,18 @@ class DocumentLoadError(Exception):
 class ValidationError(Exception):
     """Raised when request validation fails"""
     pass
+
+
+class BackendUnavailableError(Exception):
+    """Raised when no LLM/embedding backend can accept a request"""
+    pass
+
+
+class GenerationTimeoutError(Exception):
+    """Raised when generation runs past its route's latency budget"""
+    pass
+
+
+class CollectionNotFoundError(Exception):
+    """Raised when a request names a collection that is not configured"""
+    pass
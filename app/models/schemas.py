@@ -1,27 +1,115 @@
 """
 Request/Response Schemas
 
-Pydantic models for API request and response validation.
+Pydantic models for API request and response validation. Request bodies
+are parsed and validated in one pass with ``Model.model_validate_json``;
+limits that come from configuration are passed as validation context.
 """
-from pydantic import BaseModel, Field, validator
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, ValidationInfo, field_validator
+
+from app.core.constants import MSG_INVALID_SESSION
+from app.utils.helpers import validate_query
+
+# Longest accepted session id
+MAX_SESSION_ID_LENGTH = 128
+
+
+def _check_query(query: str) -> str:
+    """Validate a query string and return it stripped"""
+    is_valid, error_msg = validate_query(query)
+    if not is_valid:
+        raise ValueError(error_msg)
+    return query.strip()
+
+
+def _context_limit(info: ValidationInfo, name: str):
+    """Read a limit from the validation context (None if not given)"""
+    return (info.context or {}).get(name)
 
 
 class ChatRequest(BaseModel):
     """Schema for chat request"""
     query: str = Field(..., description="User query for the dairy farming assistant")
-    
-    @validator('query')
-    def query_not_empty(cls, v):
-        if not v or not v.strip():
-            raise ValueError('Query cannot be empty')
-        if len(v) > 1000:
-            raise ValueError('Query too long (max 1000 characters)')
-        return v.strip()
+    collection: Optional[str] = Field(None, description="Collection to answer from")
+    session_id: Optional[str] = Field(None, description="Conversation id for follow-up questions")
+
+    @field_validator('query')
+    @classmethod
+    def query_valid(cls, v: str) -> str:
+        return _check_query(v)
+
+    @field_validator('session_id', mode='before')
+    @classmethod
+    def session_id_valid(cls, v):
+        if v is not None and (not isinstance(v, str)
+                              or not 0 < len(v) <= MAX_SESSION_ID_LENGTH):
+            raise ValueError(MSG_INVALID_SESSION)
+        return v
 
 
 class ChatResponse(BaseModel):
     """Schema for chat response"""
     answer: str = Field(..., description="Assistant's response")
+    session_id: Optional[str] = Field(None, description="Conversation id, echoed back")
+
+
+class BatchChatRequest(BaseModel):
+    """Schema for batch chat request (context: max_queries)"""
+    queries: List[str] = Field(..., min_length=1, description="Independent user queries")
+    collection: Optional[str] = Field(None, description="Collection to answer from")
+
+    @field_validator('queries')
+    @classmethod
+    def queries_valid(cls, v: List[str], info: ValidationInfo) -> List[str]:
+        max_queries = _context_limit(info, 'max_queries')
+        if max_queries is not None and len(v) > max_queries:
+            raise ValueError(f"Too many queries (max {max_queries})")
+        return [_check_query(query) for query in v]
+
+
+class BatchChatItem(BaseModel):
+    """Schema for one answer of a batch; exactly one of answer/error is set"""
+    answer: Optional[str] = Field(None, description="Assistant's response")
+    error: Optional[str] = Field(None, description="Error message if the query failed")
+
+
+class BatchChatResponse(BaseModel):
+    """Schema for batch chat response, in request order"""
+    results: List[BatchChatItem]
+
+
+class SearchRequest(BaseModel):
+    """Schema for search request (context: max_k)"""
+    query: str = Field(..., description="Search query")
+    collection: Optional[str] = Field(None, description="Collection to search")
+    k: Optional[int] = Field(None, ge=1, description="Number of chunks (default RETRIEVER_K)")
+
+    @field_validator('query')
+    @classmethod
+    def query_valid(cls, v: str) -> str:
+        return _check_query(v)
+
+    @field_validator('k')
+    @classmethod
+    def k_within_limit(cls, v: Optional[int], info: ValidationInfo) -> Optional[int]:
+        max_k = _context_limit(info, 'max_k')
+        if v is not None and max_k is not None and v > max_k:
+            raise ValueError(f"Field 'k' must be at most {max_k}")
+        return v
+
+
+class SearchResult(BaseModel):
+    """Schema for one retrieved chunk"""
+    content: str = Field(..., description="Chunk text")
+    score: float = Field(..., description="Relevance score in [0, 1]")
+    source: Optional[str] = Field(None, description="Source document")
+
+
+class SearchResponse(BaseModel):
+    """Schema for search response, best match first"""
+    results: List[SearchResult]
 
 
 class HealthResponse(BaseModel):
@@ -38,3 +126,24 @@ class RebuildResponse(BaseModel):
 class ErrorResponse(BaseModel):
     """Schema for error responses"""
     error: str = Field(..., description="Error message")
+
+
+def validation_message(error: ValidationError) -> str:
+    """
+    Turn the first validation error into a client-facing message.
+
+    Args:
+        error: Pydantic validation error
+
+    Returns:
+        Error message for the 400 response
+    """
+    first = error.errors()[0]
+    field = '.'.join(str(part) for part in first['loc'])
+    if first['type'] == 'missing':
+        return f"Field '{field}' is required"
+    if first['type'] == 'value_error':
+        return str(first['ctx']['error'])
+    if not field:
+        return first['msg']
+    return f"Field '{field}': {first['msg']}"
@@ -0,0 +1,185 @@
+"""
+Journal Replay
+
+Re-sends requests recorded by the request journal (/chat, /chat/batch and
+/search) against a server, keeping their original spacing (optionally sped
+up), and reports status counts, latency percentiles and how many /chat
+answers changed.
+
+Usage:
+    python -m app.replay logs/journal*.jsonl [--url URL] [--speed 2] [--limit N]
+                         [--api-key KEY] [--header "NAME: VALUE"]
+
+All replayed requests come from one address and so share one rate limit
+bucket on the target. Turn its limiter off (RATE_LIMIT_ENABLED=false) or
+raise RATE_LIMIT_PER_MINUTE/RATE_LIMIT_BURST there; --api-key with a key
+from its RATE_LIMIT_API_KEYS keeps the replay out of the bucket of other
+clients at the same address. 429s are reported as rate_limited.
+"""
+import argparse
+import hashlib
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+
+def load_entries(paths: Iterable[str], limit: int = None) -> List[dict]:
+    """
+    Read journal files (several workers' files are merged by timestamp).
+
+    Args:
+        paths: Journal file paths
+        limit: Keep only the first N entries
+
+    Returns:
+        Entries with a query (or batch queries), oldest first
+    """
+    entries = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get('query') or entry.get('queries'):
+                    entries.append(entry)
+    entries.sort(key=lambda entry: entry.get('ts', 0))
+    return entries[:limit] if limit else entries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def replay(entries: List[dict], url: str, speed: float = 1.0,
+           concurrency: int = 64, timeout: float = 120.0,
+           headers: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Fire the entries at a server with their recorded inter-arrival times.
+
+    Args:
+        entries: Journal entries, oldest first
+        url: Server base URL
+        speed: Rate multiplier (2 replays twice as fast, 0 as fast as possible)
+        concurrency: Maximum requests in flight
+        timeout: Per-request timeout in seconds
+        headers: Sent with every request (e.g. an allow-listed X-API-Key)
+
+    Returns:
+        Summary with counts, rate-limited count, achieved rate, latency
+        percentiles and answer changes
+    """
+    results = []
+    lock = threading.Lock()
+    client = httpx.Client(base_url=url, timeout=timeout, headers=headers,
+                          limits=httpx.Limits(max_connections=concurrency))
+
+    def send(entry):
+        payload = {field: entry[field] for field in ("query", "queries", "session_id", "k")
+                   if entry.get(field)}
+        params = {"collection": entry["collection"]} if entry.get("collection") else None
+        priority = {"X-Priority": entry["priority"]} if entry.get("priority") else None
+        started = time.perf_counter()
+        try:
+            response = client.post(entry.get("path", "/chat"), json=payload,
+                                   params=params, headers=priority)
+            status = response.status_code
+            answer = response.json().get("answer") if status == 200 else None
+        except (httpx.HTTPError, ValueError):  # ValueError: body is not JSON
+            status, answer = 'error', None
+        latency_ms = (time.perf_counter() - started) * 1000
+        answer_hash = hashlib.sha1(answer.encode('utf-8')).hexdigest() if answer else None
+        with lock:
+            results.append((entry, status, latency_ms, answer_hash))
+
+    first_ts = entries[0].get('ts', 0) if entries else 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for entry in entries:
+            if speed > 0:
+                delay = (entry.get('ts', first_ts) - first_ts) / speed
+                wait = started + delay - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            pool.submit(send, entry)
+    elapsed = time.monotonic() - started
+    client.close()
+
+    statuses = {}
+    for _, status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    latencies = [latency for _, status, latency, _ in results if status == 200]
+    compared = [(entry.get('answer_hash'), answer_hash) for entry, _, _, answer_hash in results
+                if entry.get('answer_hash') and answer_hash]
+    return {
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 2),
+        "rate_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+        "statuses": statuses,
+        # Throttled by the target's rate limiter, not slow: see --api-key
+        "rate_limited": statuses.get('429', 0),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p90": round(percentile(latencies, 90), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies, default=0.0), 1),
+        },
+        "answers_compared": len(compared),
+        "answers_changed": sum(1 for recorded, replayed in compared if recorded != replayed),
+    }
+
+
+def main(argv=None) -> int:
+    """Entry point for ``python -m app.replay``"""
+    parser = argparse.ArgumentParser(description="Replay a request journal against a server")
+    parser.add_argument('journals', nargs='+', help="Journal files (rotated/worker files are merged)")
+    parser.add_argument('--url', default='http://localhost:5000', help="Server base URL")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Rate multiplier; 0 sends as fast as --concurrency allows")
+    parser.add_argument('--concurrency', type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument('--limit', type=int, help="Replay only the first N requests")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Per-request timeout")
+    parser.add_argument('--api-key',
+                        help="X-API-Key to send; list it in the target's RATE_LIMIT_API_KEYS")
+    parser.add_argument('--header', action='append', default=[], metavar='"NAME: VALUE"',
+                        help="Extra header for every request (repeatable)")
+    args = parser.parse_args(argv)
+
+    headers = {}
+    for header in args.header:
+        name, separator, value = header.partition(':')
+        if not separator or not name.strip():
+            parser.error(f"invalid --header {header!r}, expected 'NAME: VALUE'")
+        headers[name.strip()] = value.strip()
+    if args.api_key:
+        headers['X-API-Key'] = args.api_key
+
+    entries = load_entries(args.journals, args.limit)
+    if not entries:
+        print("No requests found in journal", file=sys.stderr)
+        return 1
+    summary = replay(entries, args.url, args.speed, args.concurrency, args.timeout, headers)
+    print(json.dumps(summary, indent=2))
+    if summary["rate_limited"]:
+        print(f"{summary['rate_limited']} request(s) were rate limited (429); disable or "
+              "raise the target's rate limit for capacity tests", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,40 +1,188 @@
 """
 Chat and Vector Index Routes
 """
-from flask import Blueprint, request, jsonify
-from app.services.chat_service import ChatService
-from app.services.vector_service import VectorStoreService
-from app.core.constants import MSG_INDEX_REBUILT, MSG_QUERY_REQUIRED
-from app.core.exceptions import ChatServiceError, VectorStoreError
-from app.utils.helpers import validate_query
-from app.utils.logger import setup_logger
+import hashlib
+import time
+
+from flask import Blueprint, current_app, g, request, jsonify
+from pydantic import ValidationError
+from app.services.collection_registry import CollectionRegistry
+from app.services.admission import LANE_BATCH, LANE_INTERACTIVE, client_key
+from app.core.constants import (
+    MSG_INDEX_REBUILT,
+    MSG_REBUILD_DISABLED,
+    MSG_QUERY_REQUIRED,
+    MSG_RATE_LIMITED,
+    MSG_OVERLOADED,
+)
+from app.core.exceptions import ChatServiceError, CollectionNotFoundError, VectorStoreError
+from app.models.schemas import (
+    BatchChatItem,
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatRequest,
+    ChatResponse,
+    SearchRequest,
+    SearchResponse,
+    SearchResult,
+    validation_message,
+)
+from app.utils.logger import request_id_var, setup_logger
 import os
 
 logger = setup_logger(__name__)
 
 chat_bp = Blueprint('chat', __name__)
 
+# Endpoints whose requests are recorded by the request journal
+JOURNALED_ENDPOINTS = ('chat.chat', 'chat.chat_batch', 'chat.search')
+
 # Initialize services (singleton pattern)
-_chat_service = None
-_vector_service = None
+_registry = None
 
 
-def get_chat_service():
-    """Get or create chat service instance"""
-    global _chat_service
-    if _chat_service is None:
+def get_registry():
+    """Get or create the collection registry"""
+    global _registry
+    if _registry is None:
         env = os.getenv('FLASK_ENV', 'development')
-        _chat_service = ChatService(env)
-    return _chat_service
+        _registry = CollectionRegistry(env)
+    return _registry
 
 
-def get_vector_service():
-    """Get or create vector service instance"""
-    global _vector_service
-    if _vector_service is None:
-        env = os.getenv('FLASK_ENV', 'development')
-        _vector_service = VectorStoreService(env)
-    return _vector_service
+def get_chat_service(collection=None, load=True):
+    """
+    Get the chat service for a collection.
+    
+    Args:
+        collection: Collection name (None for the default collection)
+        load: Load the collection's index if it is not resident yet
+    
+    Returns:
+        ChatService instance
+    """
+    return get_registry().get(collection, load=load)
+
+
+def _parse_body(schema, **context):
+    """
+    Parse and validate the JSON request body in one pass.
+    
+    The validated model is kept as ``g.request_body`` for the journal.
+    
+    Args:
+        schema: Pydantic request model
+        **context: Limits for the model's validators
+    
+    Returns:
+        Tuple of (model, None), or (None, 400 error response) if invalid
+    """
+    try:
+        body = schema.model_validate_json(request.get_data(), context=context)
+    except ValidationError as e:
+        return None, (jsonify({"error": validation_message(e)}), 400)
+    g.request_body = body
+    return body, None
+
+
+def _model_response(model, status=200):
+    """Serialize a response model (unset optional fields omitted)"""
+    return current_app.response_class(
+        model.model_dump_json(exclude_none=True), status=status, mimetype='application/json'
+    )
+
+
+def _client_key():
+    """Identify the caller by address, or by an allow-listed API key"""
+    return client_key(request.headers.get('X-API-Key'), request.remote_addr,
+                      current_app.config.get('RATE_LIMIT_API_KEYS', ()))
+
+
+@chat_bp.before_request
+def admit_request():
+    """
+    Apply rate limiting and load shedding before any chat route runs.
+    
+    Returns:
+        429/503 JSON response with Retry-After when rejected, otherwise None
+    """
+    g.chat_started = time.time()
+    admission = current_app.extensions.get('admission')
+    if admission is None:
+        return None
+    
+    caller = _client_key()
+    allowed, retry_after = admission.check_rate(caller)
+    if not allowed:
+        logger.warning("Rate limit exceeded for %s", caller)
+        return jsonify({"error": MSG_RATE_LIMITED}), 429, {"Retry-After": str(retry_after)}
+    
+    batch = request.headers.get('X-Priority') == LANE_BATCH or request.endpoint == 'chat.chat_batch'
+    lane = LANE_BATCH if batch else LANE_INTERACTIVE
+    if not admission.try_enter(lane):
+        logger.warning("Shedding %s request: server at capacity", lane)
+        return (jsonify({"error": MSG_OVERLOADED}), 503,
+                {"Retry-After": str(admission.shed_retry_after)})
+    g.admission_lane = lane
+    return None
+
+
+@chat_bp.after_request
+def journal_request(response):
+    """
+    Record query requests, including rejected ones, in the request journal.
+    
+    Returns:
+        The response, unchanged
+    """
+    journal = current_app.extensions.get('journal')
+    if journal is None or request.endpoint not in JOURNALED_ENDPOINTS:
+        return response
+    
+    body = g.get('request_body')
+    if body is not None:
+        data = body.model_dump()
+    else:
+        # Rejected before the route validated the body; parse it only here
+        data = request.get_json(force=True, silent=True)
+        data = data if isinstance(data, dict) else {}
+    trace = g.get('chat_trace', {})
+    started = g.get('chat_started', time.time())
+    status = response.status_code
+    if trace.get('outcome'):
+        outcome = trace['outcome']
+    elif status in (429, 503):
+        outcome = 'rejected'
+    else:
+        outcome = 'error' if status >= 400 else 'ok'
+    entry = {
+        "ts": round(started, 3),
+        "request_id": request_id_var.get(),
+        "path": request.path,
+        "query": data.get('query'),
+        "collection": request.args.get('collection') or data.get('collection'),
+        "session_id": data.get('session_id'),
+        "priority": request.headers.get('X-Priority'),
+        "status": status,
+        "outcome": outcome,
+        "route": trace.get('route'),
+        "timings": trace.get('timings', {}),
+        "total_ms": round((time.time() - started) * 1000, 1),
+        "answer_hash": trace.get('answer_hash'),
+    }
+    for field in ('queries', 'k'):  # /chat/batch and /search only
+        if data.get(field) is not None:
+            entry[field] = data[field]
+    journal.record(entry)
+    return response
+
+
+@chat_bp.teardown_request
+def release_request(exc=None):
+    """Release the in-flight slot taken in admit_request"""
+    lane = g.pop('admission_lane', None)
+    if lane is not None:
+        current_app.extensions['admission'].leave(lane)
 
 
 @chat_bp.route('/chat', methods=['POST'])
@@ -44,32 +192,151 @@ def chat():
     
     Request body:
         {
-            "query": "your question here"
+            "query": "your question here",
+            "collection": "optional collection name",
+            "session_id": "optional conversation id"
         }
     
+    The collection may also be given as ``/chat?collection=...``. With a
+    session_id, earlier turns of the conversation are used to understand
+    follow-up questions and the id is echoed in the response.
+    
     Returns:
         JSON response with answer
     """
     try:
-        data = request.get_json(force=True)
-        query = data.get('query', '').strip()
+        body, error = _parse_body(ChatRequest)
+        if error:
+            return error
+        query, session_id = body.query, body.session_id
+        collection = request.args.get('collection') or body.collection
         
-        # Validate query
-        is_valid, error_msg = validate_query(query)
-        if not is_valid:
-            return jsonify({"error": error_msg}), 400
+        # Sessions are scoped to the caller, so a known id is not enough to
+        # read or extend someone else's conversation
+        sessions = current_app.extensions.get('sessions')
+        session_key = f"{_client_key()}|{session_id}" if session_id else None
+        history = sessions.history(session_key) if sessions and session_key else []
         
         # Process query
-        chat_service = get_chat_service()
-        answer = chat_service.chat(query)
+        chat_service = get_chat_service(collection)
+        g.chat_trace = {}
+        answer = chat_service.chat(query, history, trace=g.chat_trace)
+        g.chat_trace["answer_hash"] = hashlib.sha1(answer.encode('utf-8')).hexdigest()
+        
+        if session_key is not None and sessions is not None:
+            sessions.append(session_key, query, answer)
+        return _model_response(ChatResponse(answer=answer, session_id=session_id))
         
-        return jsonify({"answer": answer}), 200
+    except CollectionNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ChatServiceError as e:
+        logger.error("Chat service error: %s", e)
+        return jsonify({"error": str(e)}), 500
+    except VectorStoreError as e:
+        logger.error("Vector store error in chat endpoint: %s", e)
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logger.error("Unexpected error in chat endpoint: %s", e)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@chat_bp.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Answer several independent queries in one request.
+    
+    Request body:
+        {
+            "queries": ["first question", "second question"],
+            "collection": "optional collection name"
+        }
+    
+    Batch requests are admitted in the batch lane and every query counts
+    against the caller's rate limit. At most BATCH_MAX_QUERIES (and at most
+    RATE_LIMIT_BURST) queries are accepted; a failing query gets an error
+    entry instead of failing the whole batch.
+    
+    Returns:
+        JSON response with one result per query, in request order
+    """
+    try:
+        admission = current_app.extensions.get('admission')
+        max_queries = current_app.config['BATCH_MAX_QUERIES']
+        if admission is not None:
+            # Each query is charged as one request, so a batch cannot exceed the burst
+            max_queries = min(max_queries, admission.burst)
+        body, error = _parse_body(BatchChatRequest, max_queries=max_queries)
+        if error:
+            return error
+        if admission is not None and len(body.queries) > 1:
+            # admit_request already charged the first query
+            caller = _client_key()
+            allowed, retry_after = admission.check_rate(caller, cost=len(body.queries) - 1)
+            if not allowed:
+                logger.warning("Rate limit exceeded for %s", caller)
+                return jsonify({"error": MSG_RATE_LIMITED}), 429, {"Retry-After": str(retry_after)}
+        collection = request.args.get('collection') or body.collection
+        chat_service = get_chat_service(collection)
+        
+        results = []
+        for query in body.queries:
+            try:
+                results.append(BatchChatItem(answer=chat_service.chat(query)))
+            except ChatServiceError as e:
+                results.append(BatchChatItem(error=str(e)))
+        return _model_response(BatchChatResponse(results=results))
+        
+    except CollectionNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except VectorStoreError as e:
+        logger.error("Vector store error in batch chat endpoint: %s", e)
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logger.error("Unexpected error in batch chat endpoint: %s", e)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@chat_bp.route('/search', methods=['POST'])
+def search():
+    """
+    Return the best matching chunks for a query without generating an answer.
+    
+    Request body:
+        {
+            "query": "search text",
+            "collection": "optional collection name",
+            "k": 10
+        }
+    
+    k defaults to RETRIEVER_K and is capped at SEARCH_MAX_K.
+    
+    Returns:
+        JSON response with chunks, scores and source documents, best first
+    """
+    try:
+        body, error = _parse_body(SearchRequest, max_k=current_app.config['SEARCH_MAX_K'])
+        if error:
+            return error
+        collection = request.args.get('collection') or body.collection
+        chat_service = get_chat_service(collection)
+        
+        docs_and_scores = chat_service.search(body.query, body.k)
+        return _model_response(SearchResponse(results=[
+            SearchResult(content=doc.page_content, score=float(score),
+                         source=doc.metadata.get('source'))
+            for doc, score in docs_and_scores
+        ]))
         
+    except CollectionNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
     except ChatServiceError as e:
-        logger.error(f"Chat service error: {str(e)}")
+        logger.error("Search error: %s", e)
+        return jsonify({"error": str(e)}), 500
+    except VectorStoreError as e:
+        logger.error("Vector store error in search endpoint: %s", e)
         return jsonify({"error": str(e)}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in chat endpoint: {str(e)}")
+        logger.error("Unexpected error in search endpoint: %s", e)
         return jsonify({"error": "An unexpected error occurred"}), 500
 
 
@@ -78,26 +345,32 @@ def rebuild_index():
     """
     Rebuild FAISS index from DOCX files in the data directory.
     
+    Use ``/rebuild_index?collection=...`` to rebuild a specific collection.
+    
     Returns:
         JSON response confirming rebuild
     """
     try:
         logger.info("Received request to rebuild index")
+        if not current_app.config.get('INDEX_BUILD_ON_DEMAND', True):
+            return jsonify({"error": MSG_REBUILD_DISABLED}), 403
+        collection = request.args.get('collection')
         
-        # Rebuild vectorstore
-        vector_service = get_vector_service()
-        vector_service.rebuild_vectorstore()
+        # Rebuild the vectorstore the chat service answers from
+        chat_service = get_chat_service(collection, load=False)
+        chat_service.vector_service.rebuild_vectorstore()
         
         # Reset chat service to use new index
-        chat_service = get_chat_service()
         chat_service.reset_chain()
         
         logger.info("Index rebuild completed successfully")
         return jsonify({"message": MSG_INDEX_REBUILT}), 200
         
+    except CollectionNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
     except VectorStoreError as e:
-        logger.error(f"Vector store error during rebuild: {str(e)}")
+        logger.error("Vector store error during rebuild: %s", e)
         return jsonify({"error": str(e)}), 500
     except Exception as e:
-        logger.error(f"Unexpected error during index rebuild: {str(e)}")
+        logger.error("Unexpected error during index rebuild: %s", e)
         return jsonify({"error": "An unexpected error occurred"}), 500
@@ -1,8 +1,10 @@
 """
 Health Check Routes
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
 from app.core.constants import MSG_HEALTH_OK
+from app.services.backend_pool import get_pools_status
+from app.utils.metrics import metrics
 
 health_bp = Blueprint('health', __name__)
 
@@ -12,10 +14,30 @@ def health_check():
     """
     Health check endpoint.
     
+    With INDEX_WATCH_ENABLED the response also lists, per collection, the
+    last re-index time and the changes still waiting to be indexed.
+    
     Returns:
         JSON response with status
     """
-    return jsonify({
+    payload = {
         "status": "ok",
         "message": MSG_HEALTH_OK
-    }), 200
+    }
+    if current_app.config.get('INDEX_WATCH_ENABLED'):
+        from app.routes.chat import get_registry
+        payload["index"] = get_registry().watch_status()
+    return jsonify(payload), 200
+
+
+@health_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    In-process metrics endpoint.
+    
+    Returns:
+        JSON response with counters, timing summaries and backend state
+    """
+    snapshot = metrics.snapshot()
+    snapshot["backends"] = get_pools_status()
+    return jsonify(snapshot), 200
@@ -0,0 +1,274 @@
+"""
+Pre-fork Production Server
+
+The master process loads the FAISS index and chunk store once, then forks
+worker processes that share those pages copy-on-write. SIGHUP reloads the
+index in the master and replaces the workers one generation at a time;
+old workers stop accepting and finish their in-flight requests first.
+
+Usage:
+    python -m app.server
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+from app import create_app
+from app.services.journal import close_journals
+from app.utils.logger import setup_logger, stop_logging
+
+logger = setup_logger(__name__)
+
+
+class InFlightTracker:
+    """WSGI middleware counting requests that have not finished yet"""
+
+    def __init__(self, app):
+        """Wrap a WSGI application"""
+        self.app = app
+        self.count = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.count += 1
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        return ClosingIterator(response, self._finished)
+
+    def _finished(self):
+        """Mark one request as done"""
+        with self._idle:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """
+        Wait until no request is in flight.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if all requests finished in time
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self.count == 0, timeout=timeout)
+
+
+def _run_worker(app, sock: socket.socket, host: str,
+                graceful_timeout: float) -> None:
+    """
+    Serve requests on the inherited listening socket until SIGTERM.
+
+    Args:
+        app: Flask application (already warmed up by the master)
+        sock: Listening socket shared by all workers
+        host: Interface the socket is bound to
+        graceful_timeout: Seconds to let in-flight requests finish on shutdown
+    """
+    tracker = InFlightTracker(app)
+    server = make_server(host, sock.getsockname()[1], tracker,
+                         threaded=True, fd=sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever exits, so call it off-thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    logger.info("Worker %s serving", os.getpid())
+    server.serve_forever()
+
+    if not tracker.wait_idle(graceful_timeout):
+        logger.warning("Worker %s exiting with %s request(s) in flight",
+                       os.getpid(), tracker.count)
+    logger.info("Worker %s stopped", os.getpid())
+
+
+class PreforkServer:
+    """Master process managing a generation of forked workers"""
+
+    def __init__(self, app, host: str, port: int, workers: int,
+                 graceful_timeout: float):
+        """
+        Initialize the master.
+
+        Args:
+            app: Flask application
+            host: Interface to bind
+            port: Port to bind
+            workers: Number of worker processes
+            graceful_timeout: Seconds workers get to finish in-flight requests
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.socket = None
+        self._pids = set()
+        self._retired = set()
+        self._reload_requested = False
+        self._stop_requested = False
+
+    def preload(self) -> None:
+        """Load the resident collections' indexes so workers inherit them"""
+        from app.routes.chat import get_registry
+
+        registry = get_registry()
+        for name in registry.loaded() or [None]:
+            chat_service = registry.get(name, load=False)
+            chat_service.vector_service.load_vectorstore()
+            chat_service.reset_chain()
+            chat_service.get_chain()
+
+        # Move everything loaded so far out of the GC's generations so
+        # collections in the workers don't touch (and copy) those pages
+        gc.collect()
+        gc.freeze()
+
+    def _spawn(self) -> int:
+        """Fork one worker and return its pid"""
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(self.app, self.socket, self.host, self.graceful_timeout)
+            except Exception:
+                logger.exception("Worker %s crashed", os.getpid())
+                exit_code = 1
+            finally:
+                close_journals()
+                stop_logging()
+                os._exit(exit_code)
+        self._pids.add(pid)
+        return pid
+
+    def _spawn_generation(self) -> set:
+        """Fork a full set of workers"""
+        return {self._spawn() for _ in range(self.workers)}
+
+    def _stop_workers(self, pids: set) -> None:
+        """Ask workers to finish in-flight requests and exit"""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self) -> set:
+        """Collect exited workers; returns their pids"""
+        exited = set()
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            exited.add(pid)
+        return exited
+
+    def reload(self) -> None:
+        """Pick up the current index from disk and replace all workers"""
+        logger.info("Reloading index and workers")
+        old = set(self._pids)
+        gc.unfreeze()
+        try:
+            self.preload()
+        except Exception as e:
+            logger.error("Reload failed, keeping current workers: %s", e)
+            gc.freeze()
+            return
+        self._pids -= old
+        self._spawn_generation()
+        self._stop_workers(old)
+        self._retired |= old
+
+    def serve(self) -> None:
+        """Bind, preload, fork workers and supervise them until stopped"""
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        self.socket.set_inheritable(True)
+        self.preload()
+        
+        # Background re-indexing happens in the master; workers pick it up on reload
+        from app.routes.chat import get_registry
+        registry = get_registry()
+        registry.on_reindexed = lambda name: setattr(self, '_reload_requested', True)
+        unwatched = sorted(set(registry.collections) - set(registry.loaded()))
+        if registry.watch and unwatched:
+            logger.info("Not watching collections loaded on demand by workers: %s",
+                        ', '.join(unwatched))
+
+        signal.signal(signal.SIGHUP, lambda s, f: setattr(self, '_reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda s, f: setattr(self, '_stop_requested', True))
+        signal.signal(signal.SIGINT, lambda s, f: setattr(self, '_stop_requested', True))
+
+        self._spawn_generation()
+        logger.info("Master %s serving on http://%s:%s with %s workers",
+                    os.getpid(), self.host, self.port, self.workers)
+
+        while not self._stop_requested:
+            if self._reload_requested:
+                self._reload_requested = False
+                self.reload()
+
+            for pid in self._reap():
+                if pid in self._retired:
+                    self._retired.discard(pid)
+                elif pid in self._pids:
+                    self._pids.discard(pid)
+                    logger.warning("Worker %s exited unexpectedly, respawning", pid)
+                    self._spawn()
+            time.sleep(0.5)
+
+        logger.info("Shutting down workers")
+        self._stop_workers(self._pids | self._retired)
+        deadline = time.monotonic() + self.graceful_timeout
+        remaining = self._pids | self._retired
+        while remaining and time.monotonic() < deadline:
+            remaining -= self._reap()
+            time.sleep(0.1)
+        for pid in remaining:
+            os.kill(pid, signal.SIGKILL)
+        self.socket.close()
+
+
+def main() -> None:
+    """Entry point for ``python -m app.server``"""
+    if not hasattr(os, 'fork'):
+        sys.exit("The pre-fork server requires a POSIX system; use run.py instead")
+
+    config_name = os.getenv('FLASK_ENV', 'production')
+    app = create_app(config_name)
+    workers = app.config['SERVER_WORKERS'] or os.cpu_count() or 1
+    if workers > 1 and app.config.get('SESSIONS_ENABLED') and not app.config.get('SESSION_STORE'):
+        logger.warning("Sessions are kept per worker; with %s workers follow-ups may lose "
+                       "their history unless requests are routed sticky or SESSION_STORE "
+                       "is shared", workers)
+    server = PreforkServer(
+        app,
+        host=os.getenv('HOST', '0.0.0.0'),
+        port=int(os.getenv('PORT', 5000)),
+        workers=workers,
+        graceful_timeout=app.config['SERVER_GRACEFUL_TIMEOUT'],
+    )
+    server.serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Admission Control
+
+Per-client token-bucket rate limiting, a global cap on in-flight
+generations with priority lanes, and load shedding for the chat routes.
+"""
+import importlib
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+# Priority lanes
+LANE_INTERACTIVE = 'interactive'
+LANE_BATCH = 'batch'
+
+
+class RateLimitStore(ABC):
+    """
+    Interface for token-bucket storage.
+
+    Subclass this to share limits between processes or hosts (e.g. Redis)
+    and point RATE_LIMIT_STORE at the implementation.
+    """
+
+    @abstractmethod
+    def consume(self, key: str, rate: float, burst: int,
+                cost: int = 1) -> Tuple[bool, float]:
+        """
+        Take tokens from the bucket identified by key.
+
+        Args:
+            key: Client identifier
+            rate: Tokens added per second
+            burst: Bucket capacity
+            cost: Tokens to take (nothing is taken if not all are available)
+
+        Returns:
+            Tuple of (allowed, seconds until enough tokens are available)
+        """
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Process-local token buckets, least recently used evicted first"""
+
+    def __init__(self, max_keys: int = 10000):
+        """
+        Initialize the store.
+
+        Args:
+            max_keys: Hard cap on tracked clients
+        """
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: float, burst: int,
+                cost: int = 1) -> Tuple[bool, float]:
+        """Take cost tokens from the bucket identified by key"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (cost - tokens) / rate
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                metrics.increment("admission.buckets_evicted")
+        return allowed, retry_after
+
+
+def client_key(api_key: Optional[str], remote_addr: Optional[str],
+               trusted_keys: Iterable[str] = ()) -> str:
+    """
+    Identify the caller for rate limiting and session ownership.
+
+    The X-API-Key header is not authenticated, so only keys on the
+    RATE_LIMIT_API_KEYS allow-list are trusted; anything else is keyed on
+    the remote address so rotating keys cannot reset the limit. Behind a
+    reverse proxy the address is only the client's with TRUSTED_PROXY_HOPS set.
+
+    Args:
+        api_key: X-API-Key header value
+        remote_addr: Client address
+        trusted_keys: Allow-listed API keys
+
+    Returns:
+        Client key
+    """
+    if api_key and api_key in trusted_keys:
+        return f"key:{api_key}"
+    return f"addr:{remote_addr or 'unknown'}"
+
+
+def _load_store(path: str) -> RateLimitStore:
+    """
+    Instantiate a rate limit store from a 'module:Class' path.
+
+    Args:
+        path: Import path of the store class (empty for in-memory)
+
+    Returns:
+        RateLimitStore instance
+    """
+    if not path:
+        return InMemoryRateLimitStore()
+    module_name, _, class_name = path.partition(':')
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class()
+
+
+class AdmissionController:
+    """Decides whether a request may start and tracks in-flight work"""
+
+    def __init__(self, requests_per_minute: float, burst: int, max_in_flight: int,
+                 max_in_flight_batch: int, shed_retry_after: int = 1,
+                 store: RateLimitStore = None):
+        """
+        Initialize the controller.
+
+        Args:
+            requests_per_minute: Sustained rate allowed per client
+            burst: Requests a client may make back-to-back
+            max_in_flight: Concurrent requests allowed in total
+            max_in_flight_batch: Concurrent requests allowed in the batch lane
+            shed_retry_after: Retry-After seconds sent when shedding load
+            store: Token bucket store (in-memory by default)
+
+        Raises:
+            ValueError: If the rate or burst is not positive
+        """
+        if requests_per_minute <= 0 or burst < 1:
+            raise ValueError("Rate limit needs a positive rate and burst "
+                             "(set RATE_LIMIT_ENABLED=false to disable it)")
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_batch = min(max_in_flight_batch, max_in_flight)
+        self.shed_retry_after = shed_retry_after
+        self.store = store or InMemoryRateLimitStore()
+        self._in_flight = {LANE_INTERACTIVE: 0, LANE_BATCH: 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'AdmissionController':
+        """
+        Create a controller from application config.
+
+        Args:
+            config: Flask config mapping
+
+        Returns:
+            AdmissionController instance
+        """
+        return cls(
+            requests_per_minute=config['RATE_LIMIT_PER_MINUTE'],
+            burst=config['RATE_LIMIT_BURST'],
+            max_in_flight=config['MAX_IN_FLIGHT'],
+            max_in_flight_batch=config['MAX_IN_FLIGHT_BATCH'],
+            shed_retry_after=config['SHED_RETRY_AFTER'],
+            store=_load_store(config['RATE_LIMIT_STORE']),
+        )
+
+    def check_rate(self, client_key: str, cost: int = 1) -> Tuple[bool, int]:
+        """
+        Apply the per-client rate limit.
+
+        Args:
+            client_key: Key from client_key()
+            cost: Requests to charge (e.g. the queries of a batch, at most burst)
+
+        Returns:
+            Tuple of (allowed, Retry-After seconds)
+        """
+        allowed, retry_after = self.store.consume(client_key, self.rate, self.burst, cost)
+        if not allowed:
+            metrics.increment("admission.rate_limited")
+        return allowed, max(1, math.ceil(retry_after))
+
+    def try_enter(self, lane: str) -> bool:
+        """
+        Reserve an in-flight slot in a lane.
+
+        Interactive requests may use every slot; batch requests are capped at
+        max_in_flight_batch so they can never crowd out interactive traffic.
+
+        Args:
+            lane: LANE_INTERACTIVE or LANE_BATCH
+
+        Returns:
+            True if the request was admitted
+        """
+        with self._lock:
+            total = sum(self._in_flight.values())
+            if total >= self.max_in_flight or (
+                lane == LANE_BATCH and self._in_flight[LANE_BATCH] >= self.max_in_flight_batch
+            ):
+                metrics.increment(f"admission.shed.{lane}")
+                return False
+            self._in_flight[lane] += 1
+            metrics.increment(f"admission.admitted.{lane}")
+            metrics.gauge("admission.in_flight", total + 1)
+            return True
+
+    def leave(self, lane: str) -> None:
+        """
+        Release an in-flight slot.
+
+        Args:
+            lane: Lane the request was admitted to
+        """
+        with self._lock:
+            self._in_flight[lane] -= 1
+            metrics.gauge("admission.in_flight", sum(self._in_flight.values()))
@@ -0,0 +1,309 @@
+"""
+Backend Pool
+
+Routes LLM and embedding calls across several Ollama hosts using
+least-outstanding-requests selection, per-backend concurrency limits and
+health-based ejection.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.exceptions import BackendUnavailableError, GenerationTimeoutError
+from app.utils.http_client import RETRYABLE_ERRORS, RetryBudget
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+
+class Backend:
+    """A single Ollama host with its in-flight accounting and cached clients"""
+
+    def __init__(self, url: str, max_concurrency: int):
+        """Initialize the backend"""
+        self.url = url
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._clients: Dict[Tuple, object] = {}
+        self._clients_lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        """Whether the backend is currently eligible for routing"""
+        return time.monotonic() >= self.ejected_until
+
+    def drop_clients(self) -> None:
+        """Forget cached clients (their connections belong to another process)"""
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def client(self, key: Tuple, factory: Callable[[str], object]):
+        """
+        Get a cached client for this backend, creating it on first use.
+
+        Reusing the client keeps its HTTP connections alive across requests.
+
+        Args:
+            key: Cache key identifying the client kind and model
+            factory: Callable building the client from the backend URL
+
+        Returns:
+            Client instance
+        """
+        with self._clients_lock:
+            if key not in self._clients:
+                self._clients[key] = factory(self.url)
+            return self._clients[key]
+
+
+class BackendPool:
+    """Pool of Ollama backends with least-outstanding-requests routing"""
+
+    def __init__(self, urls: List[str], max_concurrency: int = 4,
+                 failure_threshold: int = 3, eject_seconds: float = 30.0,
+                 acquire_timeout: float = 60.0,
+                 retry_budget: Optional[RetryBudget] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            urls: Ollama base URLs
+            max_concurrency: Maximum concurrent calls per backend
+            failure_threshold: Consecutive failures before a backend is ejected
+            eject_seconds: How long an ejected backend is skipped
+            acquire_timeout: Seconds to wait for a free slot on the chosen backend
+            retry_budget: Budget for retrying connection failures on another
+                backend (no retries if omitted)
+        """
+        if not urls:
+            raise ValueError("BackendPool requires at least one URL")
+        self.backends = [Backend(url, max_concurrency) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.acquire_timeout = acquire_timeout
+        self.retry_budget = retry_budget
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _select(self, exclude: Optional[Backend] = None) -> Backend:
+        """
+        Pick the healthy backend with the fewest outstanding requests.
+
+        Ties are broken round-robin. If every backend is ejected, the one
+        whose ejection expires first is used rather than failing outright.
+
+        Args:
+            exclude: Backend to avoid if any other is available
+        """
+        count = len(self.backends)
+        ordered = [self.backends[(self._next + i) % count] for i in range(count)]
+        self._next = (self._next + 1) % count
+        if exclude is not None and count > 1:
+            ordered.remove(exclude)
+
+        candidates = [b for b in ordered if b.healthy]
+        if not candidates:
+            return min(ordered, key=lambda b: b.ejected_until)
+        return min(candidates, key=lambda b: b.in_flight)
+
+    def _record_success(self, backend: Backend) -> None:
+        """Reset failure accounting after a successful call"""
+        with self._lock:
+            backend.consecutive_failures = 0
+            backend.ejected_until = 0.0
+
+    def _record_failure(self, backend: Backend) -> None:
+        """Count a failure and eject the backend once the threshold is hit"""
+        metrics.increment("backend.failures")
+        with self._lock:
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.failure_threshold:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+                backend.consecutive_failures = 0
+                metrics.increment("backend.ejections")
+                logger.warning("Ejecting backend %s for %.0fs",
+                               backend.url, self.eject_seconds)
+
+    @contextmanager
+    def acquire(self, exclude: Optional[Backend] = None) -> Iterator[Backend]:
+        """
+        Reserve a slot on the best backend for the duration of a call.
+
+        Args:
+            exclude: Backend to avoid if any other is available
+
+        Yields:
+            Selected Backend
+
+        Raises:
+            BackendUnavailableError: If no slot frees up within acquire_timeout
+        """
+        with self._lock:
+            backend = self._select(exclude)
+            backend.in_flight += 1
+        try:
+            if not backend._slots.acquire(timeout=self.acquire_timeout):
+                raise BackendUnavailableError(
+                    f"No free slot on backend {backend.url}"
+                )
+            try:
+                yield backend
+            except GenerationTimeoutError:
+                raise  # our own latency budget ran out; the backend may be healthy
+            except Exception:
+                self._record_failure(backend)
+                raise
+            else:
+                self._record_success(backend)
+            finally:
+                backend._slots.release()
+        finally:
+            with self._lock:
+                backend.in_flight -= 1
+
+    def call(self, key: Tuple, factory: Callable[[str], object],
+             fn: Callable[[object], object]):
+        """
+        Run fn against a client on the selected backend.
+
+        Connection failures are retried once on a different backend while
+        the retry budget allows it.
+
+        Args:
+            key: Client cache key
+            factory: Callable building the client from a backend URL
+            fn: Callable receiving the client and returning the result
+
+        Returns:
+            Result of fn
+        """
+        if self.retry_budget is not None:
+            self.retry_budget.deposit()
+        failed = None
+        while True:
+            try:
+                with self.acquire(exclude=failed) as backend:
+                    return fn(backend.client(key, factory))
+            except RETRYABLE_ERRORS:
+                if (failed is not None or self.retry_budget is None
+                        or not self.retry_budget.try_withdraw()):
+                    raise
+                metrics.increment("backend.retries")
+                logger.warning("Retrying call after connection failure on %s", backend.url)
+                failed = backend
+
+    def status(self) -> List[dict]:
+        """
+        Get the routing state of every backend.
+
+        Returns:
+            List of per-backend status dictionaries
+        """
+        with self._lock:
+            return [
+                {
+                    "url": b.url,
+                    "healthy": b.healthy,
+                    "in_flight": b.in_flight,
+                    "consecutive_failures": b.consecutive_failures,
+                }
+                for b in self.backends
+            ]
+
+
+class PooledEmbeddings(Embeddings):
+    """Embeddings that spread calls over a BackendPool"""
+
+    def __init__(self, pool: BackendPool, factory: Callable[[str], Embeddings],
+                 key: Tuple):
+        """
+        Initialize pooled embeddings.
+
+        Args:
+            pool: Backend pool to route through
+            factory: Callable building an Embeddings client for a backend URL
+            key: Client cache key
+        """
+        self.pool = pool
+        self.factory = factory
+        self.key = key
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of documents on the least loaded backend"""
+        return self.pool.call(self.key, self.factory,
+                              lambda client: client.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query on the least loaded backend"""
+        return self.pool.call(self.key, self.factory,
+                              lambda client: client.embed_query(text))
+
+
+# Pools shared by every service instance in the process, keyed by settings
+_pools: Dict[Tuple, BackendPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_backend_pool(config, urls: List[str] = None) -> BackendPool:
+    """
+    Get or create the process-wide pool for a set of backend URLs.
+
+    Args:
+        config: Configuration object
+        urls: Backend URLs (defaults to config.OLLAMA_BASE_URLS)
+
+    Returns:
+        Shared BackendPool instance
+    """
+    urls = list(urls or config.OLLAMA_BASE_URLS)
+    key = (
+        tuple(urls),
+        config.OLLAMA_MAX_CONCURRENCY,
+        config.OLLAMA_FAILURE_THRESHOLD,
+        config.OLLAMA_EJECT_SECONDS,
+    )
+    with _pools_lock:
+        if key not in _pools:
+            logger.info("Creating backend pool for %s", ', '.join(urls))
+            _pools[key] = BackendPool(
+                urls,
+                max_concurrency=config.OLLAMA_MAX_CONCURRENCY,
+                failure_threshold=config.OLLAMA_FAILURE_THRESHOLD,
+                eject_seconds=config.OLLAMA_EJECT_SECONDS,
+                acquire_timeout=config.OLLAMA_ACQUIRE_TIMEOUT,
+                retry_budget=RetryBudget(
+                    ratio=config.OLLAMA_RETRY_RATIO,
+                    reserve=config.OLLAMA_RETRY_RESERVE,
+                ),
+            )
+        return _pools[key]
+
+
+def get_pools_status() -> List[dict]:
+    """
+    Get the status of every backend in every shared pool.
+
+    Returns:
+        List of per-backend status dictionaries
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [status for pool in pools for status in pool.status()]
+
+
+def _reset_after_fork() -> None:
+    """Don't let forked workers share the parent's open HTTP connections"""
+    for pool in _pools.values():
+        for backend in pool.backends:
+            backend.drop_clients()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -3,83 +3,307 @@ Chat Service
 
 Manages LangChain RAG pipeline and chat logic.
 """
+import contextvars
+import queue
+import threading
+import time
+from functools import partial
+from operator import itemgetter
+from typing import List, Optional, Tuple
+
+import httpx
 from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-from app.core.config import get_config
-from app.core.constants import SYSTEM_PROMPT
-from app.core.exceptions import ChatServiceError
+from app.core.config import get_collection_config
+from app.core.constants import (
+    SYSTEM_PROMPT,
+    SYSTEM_INSTRUCTIONS,
+    CONTEXT_PROMPT,
+    PROMPT_LAYOUT_PREFIX_CACHE,
+    PROMPT_LAYOUTS,
+    MSG_OUT_OF_DOMAIN,
+    MSG_NO_INFORMATION,
+)
+from app.core.exceptions import (
+    BackendUnavailableError,
+    ChatServiceError,
+    GenerationTimeoutError,
+)
+from app.services.backend_pool import get_backend_pool
+from app.services.domain_classifier import DomainClassifier
+from app.services.query_router import ROUTE_FAST, ROUTE_QUALITY, QueryRouter
+from app.services.reranker import LexicalReranker
+from app.services.session_store import rewrite_followup
 from app.services.vector_service import VectorStoreService
 from app.utils.helpers import format_documents
+from app.utils.http_client import build_client_kwargs
 from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
 
 logger = setup_logger(__name__)
 
+# time.monotonic() by which the current generation must finish (None: no limit)
+generation_deadline_var = contextvars.ContextVar('generation_deadline', default=None)
+
 
 class ChatService:
     """Service class for managing chat operations and RAG pipeline"""
     
-    def __init__(self, config_name='development'):
-        """Initialize the chat service"""
-        self.config = get_config(config_name)()
-        self.vector_service = VectorStoreService(config_name)
-        self._chain = None
+    def __init__(self, config_name='development', collection=None):
+        """
+        Initialize the chat service.
+        
+        Args:
+            config_name: Configuration environment
+            collection: Collection to answer from (None for the default)
+        
+        Raises:
+            ValueError: If PROMPT_LAYOUT is not a known layout
+        """
+        self.config = get_collection_config(config_name, collection)
+        if self.config.PROMPT_LAYOUT not in PROMPT_LAYOUTS:
+            raise ValueError(
+                f"Unknown PROMPT_LAYOUT {self.config.PROMPT_LAYOUT!r} "
+                f"(expected one of: {', '.join(PROMPT_LAYOUTS)})"
+            )
+        self.vector_service = VectorStoreService(config_name, collection)
+        self.backend_pool = get_backend_pool(self.config)
+        self.router = None
+        if self.config.ROUTER_ENABLED:
+            self.router = QueryRouter(
+                min_terms_quality=self.config.ROUTER_MIN_TERMS_QUALITY,
+                confident_score=self.config.ROUTER_CONFIDENT_SCORE
+            )
+        self._chains = {}
+        self._classifier = None
+        self._classifier_source = None
+        self._reranker = None
+        self._reranker_source = None
     
-    def _create_llm(self) -> ChatOllama:
+    def _route_settings(self, route: str) -> dict:
         """
-        Create and configure the LLM instance.
+        Get the model, backend pool and limits of a route.
+        
+        Args:
+            route: ROUTE_FAST or ROUTE_QUALITY
+        
+        Returns:
+            Dictionary with model, pool, num_predict and latency_budget
+        """
+        if route == ROUTE_QUALITY:
+            return {
+                "model": self.config.QUALITY_CHAT_MODEL,
+                "pool": get_backend_pool(self.config, self.config.QUALITY_OLLAMA_BASE_URLS),
+                "num_predict": self.config.QUALITY_NUM_PREDICT,
+                "latency_budget": self.config.QUALITY_LATENCY_BUDGET,
+            }
+        return {
+            "model": self.config.CHAT_MODEL,
+            "pool": self.backend_pool,
+            "num_predict": self.config.FAST_NUM_PREDICT if self.router else None,
+            "latency_budget": self.config.FAST_LATENCY_BUDGET if self.router else None,
+        }
+    
+    def _create_llm(self, base_url: str, route: str = ROUTE_FAST) -> ChatOllama:
+        """
+        Create and configure the LLM instance for one backend.
+        
+        Args:
+            base_url: Ollama host the client talks to
+            route: Route whose model and limits to use
         
         Returns:
             Configured ChatOllama instance
         """
+        settings = self._route_settings(route)
         return ChatOllama(
-            model=self.config.CHAT_MODEL,
+            model=settings["model"],
+            base_url=base_url,
             temperature=self.config.LLM_TEMPERATURE,
-            num_ctx=self.config.LLM_NUM_CTX
+            num_ctx=self.config.LLM_NUM_CTX,
+            num_predict=settings["num_predict"],
+            keep_alive=self.config.LLM_KEEP_ALIVE,
+            client_kwargs=build_client_kwargs(self.config, settings["latency_budget"])
         )
     
     def _create_prompt(self) -> ChatPromptTemplate:
         """
         Create the chat prompt template.
         
+        With the prefix_cache layout the static instructions form an
+        invariant first message and the retrieved context follows it, so
+        Ollama can reuse the cached prefix across requests. The legacy
+        layout embeds the context inside the system prompt. Session history,
+        if any, comes before the context so it stays part of the prefix.
+        
         Returns:
             ChatPromptTemplate instance
         """
+        if self.config.PROMPT_LAYOUT == PROMPT_LAYOUT_PREFIX_CACHE:
+            return ChatPromptTemplate.from_messages([
+                ("system", SYSTEM_INSTRUCTIONS),
+                MessagesPlaceholder("history", optional=True),
+                ("system", CONTEXT_PROMPT),
+                ("human", "{input}")
+            ])
         return ChatPromptTemplate.from_messages([
             ("system", SYSTEM_PROMPT),
+            MessagesPlaceholder("history", optional=True),
             ("human", "{input}")
         ])
     
-    def _build_chain(self):
+    def _generate(self, prompt_value, route: str = ROUTE_FAST) -> AIMessage:
+        """
+        Run the route's LLM on the least loaded backend of its pool.
+        
+        Args:
+            prompt_value: Formatted prompt
+            route: ROUTE_FAST or ROUTE_QUALITY
+        
+        Returns:
+            LLM response message
+        """
+        settings = self._route_settings(route)
+        deadline = generation_deadline_var.get()
+        return settings["pool"].call(
+            ("chat", settings["model"], route),
+            partial(self._create_llm, route=route),
+            lambda llm: (llm.invoke(prompt_value) if deadline is None
+                         else self._stream_until(llm, prompt_value, deadline))
+        )
+    
+    @staticmethod
+    def _stream_until(llm, prompt_value, deadline: float) -> AIMessage:
+        """
+        Stream a response, giving up once the deadline has passed.
+        
+        The HTTP read timeout only bounds the gap between two chunks, so
+        the stream is consumed on a helper thread and the caller waits for
+        each chunk, the first one included, at most until the deadline.
+        
+        Args:
+            llm: Chat model client
+            prompt_value: Formatted prompt
+            deadline: time.monotonic() value by which generation must finish
+        
+        Returns:
+            LLM response message
+        
+        Raises:
+            GenerationTimeoutError: If the deadline passes before the response ends
+        """
+        chunks = queue.SimpleQueue()
+        stop = threading.Event()
+        
+        def consume():
+            stream = llm.stream(prompt_value)
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        break
+                    chunks.put(chunk)
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()  # drops the connection, which stops generation on the backend
+        
+        threading.Thread(target=consume, name='llm-stream', daemon=True).start()
+        message = None
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                item = chunks.get(timeout=remaining)
+            except queue.Empty:
+                # The helper thread stops at the backend's next chunk (or read timeout)
+                stop.set()
+                raise GenerationTimeoutError("Generation exceeded its latency budget")
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            message = item if message is None else message + item
+        if message is None:
+            return AIMessage(content="")
+        return AIMessage(content=message.content,
+                         response_metadata=message.response_metadata)
+    
+    def _invoke_route(self, route: str, inputs: dict, deadline: Optional[float]) -> str:
+        """
+        Run a route's chain under a wall-clock deadline.
+        
+        Args:
+            route: ROUTE_FAST or ROUTE_QUALITY
+            inputs: Chain inputs
+            deadline: time.monotonic() value by which the answer must be ready
+        
+        Returns:
+            Generated answer
+        """
+        token = generation_deadline_var.set(deadline)
+        try:
+            return self.get_chain(route).invoke(inputs)
+        finally:
+            generation_deadline_var.reset(token)
+    
+    def _record_generation_stats(self, message: AIMessage) -> AIMessage:
+        """
+        Record prefill/generation timings reported by Ollama.
+        
+        Metrics are keyed by prompt layout so the layouts can be compared.
+        
+        Args:
+            message: LLM response message
+        
+        Returns:
+            The same message, unchanged
+        """
+        info = getattr(message, "response_metadata", None) or {}
+        layout = self.config.PROMPT_LAYOUT
+        if info.get("prompt_eval_duration") is not None:
+            metrics.observe(f"llm.prefill_ms.{layout}", info["prompt_eval_duration"] / 1e6)
+        if info.get("prompt_eval_count") is not None:
+            metrics.observe(f"llm.prompt_tokens.{layout}", info["prompt_eval_count"])
+        if info.get("load_duration") is not None:
+            metrics.observe("llm.load_ms", info["load_duration"] / 1e6)
+        if info.get("eval_duration") is not None:
+            metrics.observe("llm.generate_ms", info["eval_duration"] / 1e6)
+        return message
+    
+    def _build_chain(self, route: str = ROUTE_FAST):
         """
         Build the RAG retrieval chain.
         
+        Args:
+            route: Route whose model generates the answer
+        
         Returns:
             Configured retrieval chain
         """
         try:
             logger.info("Building RAG chain...")
             
-            # Get vectorstore and create retriever
-            vectorstore = self.vector_service.get_vectorstore()
-            retriever = vectorstore.as_retriever(
-                search_kwargs={"k": self.config.RETRIEVER_K}
-            )
-            
-            # Create LLM and prompt
-            llm = self._create_llm()
+            # Create prompt (the LLM is picked per call from the backend pool)
             prompt = self._create_prompt()
             
-            # Build the chain
+            # Build the chain; retrieval happens in chat() so its scores can
+            # decide whether generation is needed at all
             chain = (
-                {
-                    "context": retriever | RunnableLambda(format_documents),
-                    "input": RunnablePassthrough(),
-                }
+                RunnablePassthrough.assign(
+                    context=itemgetter("docs") | RunnableLambda(format_documents)
+                )
                 | prompt
-                | llm
+                | RunnableLambda(lambda prompt_value: self._generate(prompt_value, route=route))
+                | RunnableLambda(self._record_generation_stats)
                 | StrOutputParser()
             )
             
@@ -87,26 +311,145 @@ class ChatService:
             return chain
             
         except Exception as e:
-            logger.error(f"Failed to build RAG chain: {str(e)}")
+            logger.error("Failed to build RAG chain: %s", e)
             raise ChatServiceError(f"Failed to build RAG chain: {str(e)}")
     
-    def get_chain(self):
+    def get_chain(self, route: str = ROUTE_FAST):
         """
-        Get the retrieval chain (builds if not already built).
+        Get the retrieval chain for a route (builds if not already built).
+        
+        Args:
+            route: ROUTE_FAST or ROUTE_QUALITY
         
         Returns:
             Retrieval chain instance
         """
-        if self._chain is None:
-            self._chain = self._build_chain()
-        return self._chain
+        if route not in self._chains:
+            self._chains[route] = self._build_chain(route)
+        return self._chains[route]
+    
+    def _retrieve(self, query: str) -> List[Tuple[Document, float]]:
+        """
+        Retrieve the top chunks for a query with relevance scores.
+        
+        With RERANK_ENABLED, RERANK_FETCH_K candidates are fetched for the
+        re-ranker instead of RETRIEVER_K.
+        
+        Args:
+            query: User query string
+        
+        Returns:
+            List of (document, relevance score in [0, 1]) pairs, best first
+        """
+        vectorstore = self.vector_service.get_vectorstore()
+        k = self.config.RERANK_FETCH_K if self.config.RERANK_ENABLED else self.config.RETRIEVER_K
+        return vectorstore.similarity_search_with_relevance_scores(query, k=k)
     
-    def chat(self, query: str) -> str:
+    def _get_classifier(self) -> DomainClassifier:
+        """
+        Get the domain classifier for the current index (rebuilt on index change).
+        
+        Returns:
+            DomainClassifier instance
+        """
+        vectorstore = self.vector_service.get_vectorstore()
+        if self._classifier is None or self._classifier_source is not vectorstore:
+            self._classifier = DomainClassifier(
+                self.vector_service.get_chunk_texts(),
+                min_overlap=self.config.DOMAIN_MIN_OVERLAP
+            )
+            self._classifier_source = vectorstore
+        return self._classifier
+    
+    def _get_reranker(self) -> LexicalReranker:
+        """
+        Get the re-ranker for the current index (rebuilt on index change).
+        
+        Returns:
+            LexicalReranker instance
+        """
+        vectorstore = self.vector_service.get_vectorstore()
+        if self._reranker is None or self._reranker_source is not vectorstore:
+            self._reranker = LexicalReranker(
+                self.vector_service.get_chunk_texts(),
+                weight=self.config.RERANK_WEIGHT,
+                cache_size=self.config.RERANK_CACHE_SIZE
+            )
+            self._reranker_source = vectorstore
+        return self._reranker
+    
+    def _canned_answer(self, query: str,
+                       docs_and_scores: List[Tuple[Document, float]]) -> Optional[str]:
+        """
+        Decide whether the query can be answered without calling the LLM.
+        
+        Args:
+            query: User query string
+            docs_and_scores: Retrieval results
+        
+        Returns:
+            Canned response if generation should be skipped, otherwise None
+        """
+        if (self.config.DOMAIN_CLASSIFIER_ENABLED
+                and not self._get_classifier().is_in_domain(query)):
+            metrics.increment("chat.generations_avoided.out_of_domain")
+            return MSG_OUT_OF_DOMAIN
+        
+        best_score = max((score for _, score in docs_and_scores), default=0.0)
+        if best_score < self.config.RETRIEVAL_MIN_SCORE:
+            metrics.increment("chat.generations_avoided.low_score")
+            return MSG_NO_INFORMATION
+        return None
+    
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[Document, float]]:
+        """
+        Retrieve the best chunks for a query without generating an answer.
+        
+        With RERANK_ENABLED the candidates are re-ranked before the top k
+        are returned.
+        
+        Args:
+            query: Search query string
+            k: Number of chunks (default RETRIEVER_K)
+        
+        Returns:
+            List of (document, relevance score) pairs, best first
+        
+        Raises:
+            ChatServiceError: If retrieval fails
+        """
+        try:
+            k = k or self.config.RETRIEVER_K
+            vectorstore = self.vector_service.get_vectorstore()
+            if not self.config.RERANK_ENABLED:
+                return vectorstore.similarity_search_with_relevance_scores(query, k=k)
+            docs_and_scores = vectorstore.similarity_search_with_relevance_scores(
+                query, k=max(k, self.config.RERANK_FETCH_K)
+            )
+            return self._get_reranker().rerank(query, docs_and_scores, k)
+        except Exception as e:
+            logger.error("Search failed: %s", e)
+            raise ChatServiceError(f"Search failed: {str(e)}")
+    
+    def chat(self, query: str, history: Optional[List[Tuple[str, str]]] = None,
+             trace: Optional[dict] = None) -> str:
         """
         Process a chat query and return the response.
         
+        With session history, follow-up questions are rewritten into a
+        standalone query for retrieval and the previous turns are included
+        in the prompt.
+        
+        Queries that are out of domain or whose best retrieved chunk scores
+        below RETRIEVAL_MIN_SCORE get the canned response directly. With
+        RERANK_ENABLED only the RERANK_TOP_N best re-ranked chunks are sent
+        to the LLM. With ROUTER_ENABLED the QueryRouter picks the fast or the
+        quality model.
+        
         Args:
             query: User query string
+            history: Previous (question, answer) turns of the session, oldest first
+            trace: If given, filled with the outcome, route and stage timings
         
         Returns:
             Chat response string
@@ -115,17 +458,94 @@ class ChatService:
             ChatServiceError: If chat processing fails
         """
         try:
-            logger.info(f"Processing query: {query[:50]}...")
-            chain = self.get_chain()
-            answer = chain.invoke(query)
-            logger.info("Query processed successfully")
+            logger.info("Processing query: %s...", query[:50], extra={"sampled": True})
+            history = history or []
+            trace = trace if trace is not None else {}
+            search_query = rewrite_followup(query, history)
+            if search_query != query:
+                metrics.increment("chat.queries_rewritten")
+            
+            timings = {}
+            started = time.perf_counter()
+            docs_and_scores = self._retrieve(search_query)
+            timings["retrieve_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            trace["timings"] = timings
+            
+            canned = self._canned_answer(search_query, docs_and_scores)
+            if canned is not None:
+                metrics.increment("chat.generations_avoided")
+                trace["outcome"] = "canned"
+                logger.info("Answered without generation",
+                            extra={"sampled": True, "timings": timings})
+                return canned
+            
+            # The router judges retrieval confidence on the raw retrieval
+            # scores; re-ranked scores are blended and never fall that low
+            retrieved = docs_and_scores
+            if self.config.RERANK_ENABLED:
+                rerank_started = time.perf_counter()
+                docs_and_scores = self._get_reranker().rerank(
+                    search_query, docs_and_scores, self.config.RERANK_TOP_N
+                )
+                timings["rerank_ms"] = round((time.perf_counter() - rerank_started) * 1000, 1)
+            docs = [doc for doc, _ in docs_and_scores]
+            metrics.observe("chat.context_chars", sum(len(doc.page_content) for doc in docs))
+            
+            route = ROUTE_FAST
+            if self.router is not None:
+                route = self.router.route(search_query, retrieved)
+            
+            inputs = {
+                "input": query,
+                "docs": docs,
+                "history": [
+                    message
+                    for question, answer in history
+                    for message in (HumanMessage(question), AIMessage(answer))
+                ]
+            }
+            generate_started = time.perf_counter()
+            # The route's latency budget covers the whole generation, fallback
+            # included: the quality model leaves time for the fast one
+            now = time.monotonic()
+            fast_budget = self._route_settings(ROUTE_FAST)["latency_budget"]
+            if route == ROUTE_QUALITY:
+                budget = self.config.QUALITY_LATENCY_BUDGET
+                deadline = now + budget
+                route_deadline = deadline - min(fast_budget or 0, budget / 2)
+            else:
+                deadline = route_deadline = now + fast_budget if fast_budget else None
+            try:
+                answer = self._invoke_route(route, inputs, route_deadline)
+            except (BackendUnavailableError, GenerationTimeoutError,
+                    httpx.TimeoutException, ConnectionError) as e:
+                if route == ROUTE_FAST:
+                    raise
+                # The quality model is a bonus; answer with the fast one instead
+                logger.warning("Quality route failed (%s), falling back to fast model", e)
+                metrics.increment("chat.route_fallbacks")
+                route = ROUTE_FAST
+                if fast_budget:
+                    deadline = min(deadline, time.monotonic() + fast_budget)
+                answer = self._invoke_route(route, inputs, deadline)
+            timings["generate_ms"] = round((time.perf_counter() - generate_started) * 1000, 1)
+            trace.update(outcome="generated", route=route)
+            metrics.increment("chat.generations")
+            metrics.increment(f"chat.route.{route}")
+            metrics.observe(f"chat.generate_ms.{route}", timings["generate_ms"])
+            for stage, value in timings.items():
+                metrics.observe(f"chat.{stage}", value)
+            logger.info("Query processed successfully (%s model)", route,
+                        extra={"sampled": True, "timings": timings})
             return answer
             
         except Exception as e:
-            logger.error(f"Chat processing failed: {str(e)}")
+            logger.error("Chat processing failed: %s", e)
             raise ChatServiceError(f"Chat processing failed: {str(e)}")
     
     def reset_chain(self) -> None:
         """Reset the chain (forces rebuild on next query)"""
         logger.info("Resetting chat chain")
-        self._chain = None
+        self._chains = {}
+        self._classifier = None
+        self._reranker = None
@@ -0,0 +1,168 @@
+"""
+Collection Registry
+
+Keeps one ChatService per named collection, loading its index on first use
+and evicting the least recently used collections once the resident indexes
+exceed the memory budget. With INDEX_WATCH_ENABLED each loaded collection
+gets an IndexWatcher that re-indexes it when its documents change. Forked
+workers never start watchers, so under app.server only the collections the
+master loaded are watched.
+"""
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from app.core.config import get_collection_config, load_collections
+from app.core.exceptions import CollectionNotFoundError
+from app.services.chat_service import ChatService
+from app.services.index_watcher import IndexWatcher
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+# Registries in this process, so watching can be disabled in forked children
+_registries = weakref.WeakSet()
+
+
+class CollectionRegistry:
+    """LRU of per-collection chat services bounded by a memory budget"""
+
+    def __init__(self, config_name='development'):
+        """
+        Initialize the registry.
+
+        Args:
+            config_name: Configuration environment
+        """
+        self.config_name = config_name
+        config = get_collection_config(config_name)
+        self.default_collection = config.DEFAULT_COLLECTION
+        self.collections = load_collections(config)
+        self.memory_budget = int(config.COLLECTION_MEMORY_BUDGET_MB * 1024 * 1024)
+        self._services = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.collections}
+        self.watch = config.INDEX_WATCH_ENABLED
+        self.debounce_seconds = config.INDEX_WATCH_DEBOUNCE
+        self.poll_interval = config.INDEX_WATCH_POLL_INTERVAL
+        self.on_reindexed = None
+        self._watchers = {}
+        _registries.add(self)
+
+    def get(self, collection=None, load=True) -> ChatService:
+        """
+        Get the chat service for a collection, loading its index if needed.
+
+        Args:
+            collection: Collection name (None for the default collection)
+            load: Load the index now (False when it is about to be rebuilt)
+
+        Returns:
+            ChatService bound to the collection
+
+        Raises:
+            CollectionNotFoundError: If the collection is not configured
+        """
+        name = collection or self.default_collection
+        if name not in self.collections:
+            raise CollectionNotFoundError(f"Unknown collection: {name}")
+
+        with self._lock:
+            service = self._services.get(name)
+            if service is not None:
+                self._services.move_to_end(name)
+                return service
+
+        # Load outside the registry lock so other collections stay available
+        with self._load_locks[name]:
+            with self._lock:
+                service = self._services.get(name)
+            if service is None:
+                logger.info("Loading collection %s", name)
+                service = ChatService(self.config_name, name)
+                if load:
+                    service.vector_service.get_vectorstore()
+                metrics.increment("collections.loads")
+                with self._lock:
+                    self._services[name] = service
+                    self._evict(keep=name)
+                if self.watch:
+                    self._start_watcher(name, service)
+        return service
+    
+    def _start_watcher(self, name: str, service: ChatService) -> None:
+        """Start re-indexing a collection in the background when its files change"""
+        def reindexed():
+            service.reset_chain()
+            if self.on_reindexed is not None:
+                self.on_reindexed(name)
+        
+        watcher = IndexWatcher(service.vector_service,
+                               debounce_seconds=self.debounce_seconds,
+                               poll_interval=self.poll_interval,
+                               on_reindexed=reindexed)
+        with self._lock:
+            previous = self._watchers.pop(name, None)
+            self._watchers[name] = watcher
+        if previous is not None:
+            previous.stop()
+        watcher.start()
+    
+    def watch_status(self) -> dict:
+        """
+        Get the index watcher state of each watched collection.
+        
+        Returns:
+            Dictionary of collection name to watcher status
+        """
+        with self._lock:
+            watchers = dict(self._watchers)
+        return {name: watcher.status() for name, watcher in watchers.items()}
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used collections until within the memory budget"""
+        resident = self.resident_bytes()
+        while resident > self.memory_budget and len(self._services) > 1:
+            name = next(iter(self._services))
+            if name == keep:
+                self._services.move_to_end(name)
+                continue
+            evicted = self._services.pop(name)
+            watcher = self._watchers.pop(name, None)
+            if watcher is not None:
+                watcher.stop()
+            resident -= evicted.vector_service.memory_footprint()
+            metrics.increment("collections.evictions")
+            logger.info("Evicted collection %s to stay within memory budget", name)
+        metrics.gauge("collections.resident_bytes", resident)
+
+    def resident_bytes(self) -> int:
+        """
+        Estimate memory held by all loaded collections.
+
+        Returns:
+            Approximate size in bytes
+        """
+        return sum(s.vector_service.memory_footprint() for s in self._services.values())
+
+    def loaded(self) -> list:
+        """
+        Get the currently loaded collections, least recently used first.
+
+        Returns:
+            List of collection names
+        """
+        with self._lock:
+            return list(self._services)
+
+
+def _stop_watching_after_fork():
+    """Watcher threads stay in the parent; forked workers must not start their own"""
+    for registry in list(_registries):
+        registry.watch = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_stop_watching_after_fork)
@@ -0,0 +1,53 @@
+"""
+Domain Classifier
+
+Cheap keyword check of whether a query is about the indexed corpus at all.
+"""
+from typing import Iterable
+
+from app.utils.helpers import tokenize
+
+
+class DomainClassifier:
+    """Keyword classifier built from the vocabulary of the indexed chunks"""
+    
+    def __init__(self, texts: Iterable[str], min_overlap: float = 0.2):
+        """
+        Build the corpus vocabulary.
+        
+        Args:
+            texts: Chunk texts of the index
+            min_overlap: Minimum fraction of query terms that must occur in
+                the corpus for the query to count as in-domain
+        """
+        self.min_overlap = min_overlap
+        self.vocabulary = set()
+        for text in texts:
+            self.vocabulary.update(tokenize(text))
+    
+    def overlap(self, query: str) -> float:
+        """
+        Fraction of the query's content words found in the corpus.
+        
+        Args:
+            query: User query
+        
+        Returns:
+            Overlap ratio between 0 and 1 (1 for queries without content words)
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return 1.0
+        return sum(token in self.vocabulary for token in tokens) / len(tokens)
+    
+    def is_in_domain(self, query: str) -> bool:
+        """
+        Check whether the query shares enough vocabulary with the corpus.
+        
+        Args:
+            query: User query
+        
+        Returns:
+            True if the query looks in-domain
+        """
+        return self.overlap(query) >= self.min_overlap
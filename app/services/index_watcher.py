@@ -0,0 +1,187 @@
+"""
+Index Watcher
+
+Watches a collection's DATA_DIR and re-indexes added, modified or removed
+documents in the background. File events come from watchdog (inotify on
+Linux) when it is installed; otherwise the directory is polled. Bursts of
+changes are debounced until the directory has been stable for a while.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional dependency
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = setup_logger(__name__)
+
+MODE_EVENTS = 'events'
+MODE_POLLING = 'polling'
+
+
+class _WakeHandler(FileSystemEventHandler):
+    """watchdog handler that wakes the watcher thread on any event"""
+
+    def __init__(self, wake: threading.Event):
+        super().__init__()
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class IndexWatcher:
+    """Background re-indexing of one vector store when its documents change"""
+
+    def __init__(self, vector_service, debounce_seconds: float = 5.0,
+                 poll_interval: float = 10.0,
+                 on_reindexed: Optional[Callable[[], None]] = None):
+        """
+        Initialize the watcher.
+
+        Args:
+            vector_service: VectorStoreService whose DATA_DIR is watched
+            debounce_seconds: Quiet period required before re-indexing
+            poll_interval: Seconds between directory scans without watchdog
+            on_reindexed: Called after each successful re-index
+        """
+        self.vector_service = vector_service
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.on_reindexed = on_reindexed
+        self.mode = MODE_EVENTS if Observer is not None else MODE_POLLING
+        self.last_indexed_at = None
+        self.last_error = None
+        self.pending_changes = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+
+    def _diff(self, current: Dict[str, list]):
+        """Split the difference between the index and the directory"""
+        indexed = self.vector_service.indexed_sources
+        changed = sorted(name for name, stat in current.items() if indexed.get(name) != stat)
+        removed = sorted(name for name in indexed if name not in current)
+        return changed, removed
+
+    def check(self) -> bool:
+        """
+        Re-index if the data directory differs from the index.
+
+        Waits until the directory listing is unchanged for debounce_seconds
+        before re-indexing, so a burst of copies triggers one update.
+
+        Returns:
+            True if a re-index ran successfully
+        """
+        # Loading the index also loads the source list it was built from
+        self.vector_service.get_vectorstore()
+        current = self.vector_service.list_source_files()
+        changed, removed = self._diff(current)
+        self.pending_changes = changed + removed
+        if not self.pending_changes:
+            return False
+
+        while True:
+            if self._stop.wait(self.debounce_seconds):
+                return False
+            latest = self.vector_service.list_source_files()
+            if latest == current:
+                break
+            current = latest
+        changed, removed = self._diff(current)
+        self.pending_changes = changed + removed
+        if not self.pending_changes:
+            return False
+
+        logger.info("Re-indexing %s changed and %s removed file(s) in %s",
+                    len(changed), len(removed), self.vector_service.config.DATA_DIR)
+        try:
+            self.vector_service.update_files(changed, removed)
+        except Exception as e:
+            self.last_error = str(e)
+            metrics.increment("index.reindex_failures")
+            logger.error("Background re-index failed: %s", e)
+            return False
+
+        self.last_indexed_at = time.time()
+        self.last_error = None
+        self.pending_changes = []
+        metrics.increment("index.reindexes")
+        if self.on_reindexed is not None:
+            self.on_reindexed()
+        return True
+
+    def _run(self) -> None:
+        """Watcher thread: wait for events (or poll), then check"""
+        timeout = None if self.mode == MODE_EVENTS else self.poll_interval
+        # Pick up changes made while the server was down
+        self._wake.set()
+        while not self._stop.is_set():
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Index watcher check failed: %s", e)
+
+    def start(self) -> None:
+        """Start watching in a daemon thread"""
+        if self._thread is not None:
+            return
+        if self.mode == MODE_EVENTS and not os.path.isdir(self.vector_service.config.DATA_DIR):
+            self.mode = MODE_POLLING
+        if self.mode == MODE_EVENTS:
+            self._observer = Observer()
+            self._observer.schedule(_WakeHandler(self._wake),
+                                    self.vector_service.config.DATA_DIR)
+            self._observer.daemon = True
+            self._observer.start()
+        self._thread = threading.Thread(target=self._run, name='index-watcher', daemon=True)
+        self._thread.start()
+        logger.info("Watching %s for document changes (%s)",
+                    self.vector_service.config.DATA_DIR, self.mode)
+
+    def stop(self) -> None:
+        """Stop the watcher thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        self._thread = None
+
+    def status(self) -> dict:
+        """
+        Get the watcher state for health output.
+
+        Returns:
+            Dictionary with mode, last_indexed_at, pending_changes and last_error
+        """
+        indexed_at = self.last_indexed_at
+        index_file = os.path.join(self.vector_service.config.VECTOR_DIR, 'index.faiss')
+        if indexed_at is None and os.path.exists(index_file):
+            indexed_at = os.path.getmtime(index_file)
+        last_indexed_at = None
+        if indexed_at is not None:
+            last_indexed_at = datetime.fromtimestamp(
+                indexed_at, timezone.utc
+            ).isoformat(timespec='seconds')
+        return {
+            "mode": self.mode,
+            "last_indexed_at": last_indexed_at,
+            "pending_changes": list(self.pending_changes),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,171 @@
+"""
+Request Journal
+
+Append-only JSON Lines record of /chat traffic for load replay
+(``python -m app.replay``). Request threads only enqueue entries; a
+background thread writes them in batches and rotates the file by size.
+Forked worker processes write to their own file (journal.<pid>.jsonl) so
+they never rotate each other's files.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+# Journals in this process, restarted in forked children
+_journals = []
+
+
+class RequestJournal:
+    """Batched, rotating JSON Lines writer fed from a bounded queue"""
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 max_queue: int = 10000):
+        """
+        Initialize the journal and start its writer thread.
+
+        Args:
+            path: Journal file path
+            batch_size: Maximum entries per write
+            flush_interval: Maximum seconds an entry waits before being written
+            max_bytes: Rotate the file once it reaches this size
+            backup_count: Rotated files to keep (path.1 ... path.N)
+            max_queue: Entries buffered before new ones are dropped
+        """
+        self.base_path = path
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_queue = max_queue
+        self._start()
+        _journals.append(self)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config) -> 'RequestJournal':
+        """
+        Create a journal from application config.
+
+        Args:
+            config: Flask config mapping
+
+        Returns:
+            RequestJournal instance
+        """
+        return cls(
+            path=config['JOURNAL_PATH'],
+            batch_size=config['JOURNAL_BATCH_SIZE'],
+            flush_interval=config['JOURNAL_FLUSH_INTERVAL'],
+            max_bytes=config['JOURNAL_MAX_BYTES'],
+            backup_count=config['JOURNAL_BACKUP_COUNT'],
+            max_queue=config['JOURNAL_QUEUE_SIZE'],
+        )
+
+    def _start(self) -> None:
+        """Create the queue and writer thread"""
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='request-journal', daemon=True)
+        self._thread.start()
+
+    def record(self, entry: dict) -> None:
+        """
+        Queue an entry without blocking; it is dropped if the queue is full.
+
+        Args:
+            entry: JSON-serializable request record
+        """
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            metrics.increment("journal.dropped")
+
+    def _run(self) -> None:
+        """Writer thread: gather a batch, write it, repeat until closed"""
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+            try:
+                self._write(batch)
+            except Exception as e:
+                metrics.increment("journal.dropped", len(batch))
+                logger.error("Failed to write request journal: %s", e)
+            if stop:
+                return
+
+    def _write(self, batch: list) -> None:
+        """Append one batch, rotating the file first if it is full"""
+        data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in batch)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+        metrics.increment("journal.written", len(batch))
+
+    def _rotate(self) -> None:
+        """Shift path -> path.1 -> ... -> path.N, dropping the oldest"""
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write everything queued so far and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+
+def close_journals() -> None:
+    """Flush and stop every journal (for processes leaving via os._exit)"""
+    for journal in _journals:
+        journal.close()
+
+
+def _restart_after_fork():
+    """Threads do not survive fork; give each child its own writer"""
+    for journal in _journals:
+        if not journal._closed:
+            root, ext = os.path.splitext(journal.base_path)
+            journal.path = f"{root}.{os.getpid()}{ext}"
+            journal._start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,172 @@
+"""
+Quantized Vector Index
+
+Compresses the FAISS index with scalar (fp16/int8) or product quantization.
+The original float32 vectors are kept on disk and memory-mapped, so the top
+candidates from the compressed index can be re-ranked exactly without
+holding the full vectors in RAM.
+"""
+import math
+from typing import List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+from app.core.constants import QUANTIZATION_FP16, QUANTIZATION_INT8, QUANTIZATION_PQ
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+VECTORS_FILE = 'vectors.npy'
+
+
+def quantize_index(vectors: np.ndarray, mode: str, metric: int = faiss.METRIC_L2,
+                   pq_m: int = 16, pq_nbits: int = 8):
+    """
+    Build a compressed FAISS index over the given vectors.
+
+    Args:
+        vectors: float32 array of shape (n, d)
+        mode: One of fp16, int8 or pq
+        metric: FAISS metric of the original index
+        pq_m: Number of PQ sub-quantizers (must divide d)
+        pq_nbits: Bits per PQ code; lowered if there are too few vectors to train
+
+    Returns:
+        Trained FAISS index containing all vectors
+
+    Raises:
+        ValueError: If the mode or PQ parameters are invalid
+    """
+    n, d = vectors.shape
+    if mode == QUANTIZATION_FP16:
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, metric)
+    elif mode == QUANTIZATION_INT8:
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, metric)
+    elif mode == QUANTIZATION_PQ:
+        if d % pq_m:
+            raise ValueError(f"PQ_M={pq_m} must divide the embedding size {d}")
+        # Each sub-quantizer needs at least 2**nbits training vectors
+        nbits = min(pq_nbits, int(math.log2(max(n, 2))))
+        if nbits < pq_nbits:
+            logger.warning("Only %s vectors; using %s-bit PQ codes instead of %s",
+                           n, nbits, pq_nbits)
+        index = faiss.IndexPQ(d, pq_m, nbits, metric)
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def rerank_search(index, vectors: np.ndarray, query: np.ndarray, k: int,
+                  factor: int, metric: int = faiss.METRIC_L2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search the compressed index for k * factor candidates and re-score them
+    with the exact float vectors.
+
+    Args:
+        index: Compressed FAISS index
+        vectors: Float vectors in index order (may be memory-mapped)
+        query: float32 query of shape (d,)
+        k: Number of results
+        factor: Candidate over-fetch factor
+        metric: FAISS metric of the index
+
+    Returns:
+        Tuple of (exact scores, positions), best first, at most k each
+    """
+    _, candidates = index.search(query.reshape(1, -1), k * factor)
+    positions = candidates[0][candidates[0] != -1]
+    if not len(positions):
+        return np.empty(0, dtype=np.float32), positions
+
+    # Sorted positions keep reads from the memory map sequential
+    positions = np.sort(positions)
+    candidate_vectors = np.asarray(vectors[positions], dtype=np.float32)
+    if metric == faiss.METRIC_INNER_PRODUCT:
+        scores = candidate_vectors @ query
+        order = np.argsort(-scores)[:k]
+    else:
+        scores = ((candidate_vectors - query) ** 2).sum(axis=1)
+        order = np.argsort(scores)[:k]
+    return scores[order], positions[order]
+
+
+def recall_at_k(exact_index, search_fn, queries: np.ndarray, k: int) -> float:
+    """
+    Measure how many of the exact top-k neighbours a search returns.
+
+    Args:
+        exact_index: Unquantized FAISS index
+        search_fn: Callable(query, k) returning result positions
+        queries: float32 array of query vectors
+        k: Number of neighbours compared
+
+    Returns:
+        Mean recall@k over the queries
+    """
+    if not len(queries):
+        return 1.0
+    _, expected = exact_index.search(queries, k)
+    hits = 0
+    total = 0
+    for query, truth in zip(queries, expected):
+        truth = set(truth[truth != -1].tolist())
+        found = set(np.asarray(search_fn(query, k)).tolist())
+        hits += len(truth & found)
+        total += len(truth)
+    return hits / total if total else 1.0
+
+
+class QuantizedFAISS(FAISS):
+    """FAISS vectorstore that re-ranks compressed-index hits with exact vectors"""
+
+    rerank_vectors: Optional[np.ndarray] = None
+    rerank_factor: int = 4
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter=None,
+        fetch_k: int = 20,
+        **kwargs,
+    ) -> List[Tuple[Document, float]]:
+        """Same contract as FAISS, with exact scores for the returned documents"""
+        if self.rerank_vectors is None:
+            return super().similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter, fetch_k=fetch_k, **kwargs
+            )
+
+        query = np.array(embedding, dtype=np.float32)
+        if self._normalize_L2:
+            query /= np.linalg.norm(query) or 1.0
+        inner_product = self.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+        scores, positions = rerank_search(
+            self.index, self.rerank_vectors, query,
+            k if filter is None else fetch_k, self.rerank_factor,
+            faiss.METRIC_INNER_PRODUCT if inner_product else faiss.METRIC_L2
+        )
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        score_threshold = kwargs.get("score_threshold")
+        docs = []
+        for score, position in zip(scores, positions):
+            _id = self.index_to_docstore_id[int(position)]
+            doc = self.docstore.search(_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Could not find document for id {_id}, got {doc}")
+            if filter_func is not None and not filter_func(doc.metadata):
+                continue
+            if score_threshold is not None and (
+                score < score_threshold if inner_product else score > score_threshold
+            ):
+                continue
+            docs.append((doc, float(score)))
+        return docs[:k]
+
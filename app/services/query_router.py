@@ -0,0 +1,63 @@
+"""
+Query Router
+
+Cheap per-query choice between a fast small model and a slower quality
+model, based on the wording of the query and how confidently retrieval
+matched it.
+"""
+import re
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+from app.utils.helpers import tokenize
+
+# Routes
+ROUTE_FAST = 'fast'
+ROUTE_QUALITY = 'quality'
+
+# Words asking for reasoning rather than a lookup
+_REASONING_WORDS = frozenset(
+    "why compare comparison difference differences versus explain calculate "
+    "calculation plan schedule formulate ration advantages disadvantages "
+    "recommend best economics profit vs".split()
+)
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+class QueryRouter:
+    """Route queries to the fast or the quality model"""
+
+    def __init__(self, min_terms_quality: int = 12, confident_score: float = 0.5):
+        """
+        Initialize the router.
+
+        Args:
+            min_terms_quality: Queries with at least this many content words
+                go to the quality model
+            confident_score: Queries whose best retrieval score is below this
+                go to the quality model
+        """
+        self.min_terms_quality = min_terms_quality
+        self.confident_score = confident_score
+
+    def route(self, query: str, docs_and_scores: List[Tuple[Document, float]]) -> str:
+        """
+        Pick the route for a query.
+
+        Args:
+            query: (Standalone) user query
+            docs_and_scores: Retrieval results with relevance scores
+
+        Returns:
+            ROUTE_FAST or ROUTE_QUALITY
+        """
+        words = set(_WORD_RE.findall(query.lower()))
+        if words & _REASONING_WORDS:
+            return ROUTE_QUALITY
+        if query.count('?') > 1 or len(tokenize(query)) >= self.min_terms_quality:
+            return ROUTE_QUALITY
+        best_score = max((score for _, score in docs_and_scores), default=0.0)
+        if best_score < self.confident_score:
+            return ROUTE_QUALITY
+        return ROUTE_FAST
@@ -0,0 +1,141 @@
+"""
+Lexical Re-ranker
+
+BM25 re-scoring of retrieved chunks on the CPU, so fewer (better) chunks
+can be sent to the LLM. Scores are cached per (query, chunk) pair.
+"""
+import hashlib
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Tuple
+
+from langchain_core.documents import Document
+
+from app.utils.helpers import tokenize
+from app.utils.metrics import metrics
+
+
+class LexicalReranker:
+    """BM25 scorer with corpus statistics from the indexed chunks"""
+
+    def __init__(self, texts: Iterable[str], weight: float = 0.5,
+                 cache_size: int = 10000, k1: float = 1.2, b: float = 0.75):
+        """
+        Build document frequencies for the corpus.
+
+        Args:
+            texts: Chunk texts of the index
+            weight: Share of the BM25 score in the final score; the rest is
+                the retriever's relevance score
+            cache_size: Maximum number of cached (query, chunk) scores
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.weight = weight
+        self.cache_size = cache_size
+        self.k1 = k1
+        self.b = b
+
+        self._doc_freq = Counter()
+        total_length = 0
+        self._num_docs = 0
+        for text in texts:
+            tokens = tokenize(text)
+            self._doc_freq.update(set(tokens))
+            total_length += len(tokens)
+            self._num_docs += 1
+        self._avg_length = total_length / self._num_docs if self._num_docs else 1.0
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _idf(self, term: str) -> float:
+        """Smoothed inverse document frequency (always positive)"""
+        df = self._doc_freq.get(term, 0)
+        return math.log(1 + (self._num_docs - df + 0.5) / (df + 0.5))
+
+    def _bm25(self, query_terms: List[str], text: str) -> float:
+        """BM25 score of one chunk for the query terms"""
+        tokens = tokenize(text)
+        if not tokens:
+            return 0.0
+        freqs = Counter(tokens)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self._avg_length)
+        score = 0.0
+        for term in query_terms:
+            tf = freqs.get(term, 0)
+            if tf:
+                score += self._idf(term) * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    @staticmethod
+    def _chunk_id(doc: Document) -> str:
+        """Stable identifier of a chunk for the score cache"""
+        return doc.id or hashlib.blake2b(doc.page_content.encode('utf-8'),
+                                         digest_size=16).hexdigest()
+
+    def score(self, query: str, docs: List[Document]) -> List[float]:
+        """
+        BM25 scores for a batch of chunks, using cached scores where possible.
+
+        Args:
+            query: User query
+            docs: Candidate chunks
+
+        Returns:
+            One score per chunk, in the same order
+        """
+        query_terms = tokenize(query)
+        query_key = hashlib.blake2b(' '.join(sorted(query_terms)).encode('utf-8'),
+                                    digest_size=16).hexdigest()
+        keys = [(query_key, self._chunk_id(doc)) for doc in docs]
+
+        scores = [None] * len(docs)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        metrics.increment("reranker.cache_hits", len(docs) - len(missing))
+        metrics.increment("reranker.cache_misses", len(missing))
+        if not missing:
+            return scores
+
+        for i in missing:
+            scores[i] = self._bm25(query_terms, docs[i].page_content)
+        with self._lock:
+            for i in missing:
+                self._cache[keys[i]] = scores[i]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, docs_and_scores: List[Tuple[Document, float]],
+               top_n: int) -> List[Tuple[Document, float]]:
+        """
+        Re-order retrieval results and keep the best top_n.
+
+        The final score blends the BM25 score (scaled to [0, 1] within the
+        batch) with the retriever's relevance score.
+
+        Args:
+            query: User query
+            docs_and_scores: (document, relevance score) pairs from the retriever
+            top_n: Number of chunks to keep
+
+        Returns:
+            Best top_n (document, final score) pairs, best first
+        """
+        if not docs_and_scores:
+            return []
+        lexical = self.score(query, [doc for doc, _ in docs_and_scores])
+        best = max(lexical) or 1.0
+        combined = [
+            (doc, self.weight * lex / best + (1 - self.weight) * relevance)
+            for (doc, relevance), lex in zip(docs_and_scores, lexical)
+        ]
+        combined.sort(key=lambda pair: pair[1], reverse=True)
+        return combined[:top_n]
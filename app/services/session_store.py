@@ -0,0 +1,278 @@
+"""
+Conversation Sessions
+
+In-process store of recent chat turns per session id. Sessions expire
+after a period of inactivity, and the least recently used sessions are
+evicted when the store exceeds its session count or memory cap. Answers
+are truncated when stored, so each session stays small.
+
+The in-memory store lives in one process: with several pre-fork workers a
+follow-up may reach a worker without the history. Use sticky routing, or
+implement SessionBackend on shared storage and set SESSION_STORE.
+"""
+import importlib
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import List, Tuple
+
+from app.utils.helpers import tokenize
+from app.utils.metrics import metrics
+
+# Rough token estimate for budgeting history (about 4 characters per token)
+CHARS_PER_TOKEN = 4
+
+# Openers and pronouns that mark a question as depending on the previous turn
+_FOLLOWUP_OPENERS = ('and ', 'also ', 'but ', 'so ', 'then ', 'what about ', 'how about ')
+_REFERENCE_WORDS = frozenset("it its they them their this these those".split())
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Questions with at most this many content words are treated as follow-ups
+_FOLLOWUP_MAX_TERMS = 3
+
+
+class _Session:
+    """Recent turns of one conversation"""
+
+    __slots__ = ('turns', 'last_used', 'size')
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.last_used = time.monotonic()
+        self.size = 0
+
+
+class SessionBackend(ABC):
+    """
+    Interface for conversation history storage.
+
+    Subclass this to share sessions between processes or hosts (e.g. Redis)
+    and point SESSION_STORE at the implementation. Session ids passed in
+    are already scoped to the calling client.
+    """
+
+    @classmethod
+    def from_config(cls, config) -> 'SessionBackend':
+        """
+        Create a backend from application config.
+
+        Args:
+            config: Flask config mapping
+
+        Returns:
+            SessionBackend instance
+        """
+        return cls()
+
+    @abstractmethod
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        """
+        Get the recent turns of a session.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            List of (question, answer) pairs, oldest first
+        """
+
+    @abstractmethod
+    def append(self, session_id: str, question: str, answer: str) -> None:
+        """
+        Record a turn.
+
+        Args:
+            session_id: Session identifier
+            question: User query
+            answer: Assistant answer
+        """
+
+
+def load_session_store(config) -> SessionBackend:
+    """
+    Create the session store named by SESSION_STORE ('module:Class').
+
+    Args:
+        config: Flask config mapping
+
+    Returns:
+        SessionBackend instance (in-memory SessionStore if not set)
+    """
+    path = config.get('SESSION_STORE')
+    if not path:
+        return SessionStore.from_config(config)
+    module_name, _, class_name = path.partition(':')
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class.from_config(config)
+
+
+class SessionStore(SessionBackend):
+    """Bounded, expiring in-process store of conversation history"""
+
+    def __init__(self, ttl_seconds: float = 1800, max_sessions: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, max_turns: int = 6,
+                 history_tokens: int = 400, answer_chars: int = 400):
+        """
+        Initialize the store.
+
+        Args:
+            ttl_seconds: Idle time after which a session is dropped
+            max_sessions: Maximum number of sessions kept
+            max_bytes: Approximate memory cap for all stored turns
+            max_turns: Turns kept per session
+            history_tokens: Token budget of the history returned for a prompt
+            answer_chars: Stored answers are truncated to this length
+
+        Raises:
+            ValueError: If max_turns is less than 1
+        """
+        if max_turns < 1:
+            raise ValueError("SESSION_MAX_TURNS must be at least 1 "
+                             "(set SESSIONS_ENABLED=false to disable sessions)")
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.history_tokens = history_tokens
+        self.answer_chars = answer_chars
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'SessionStore':
+        """
+        Create a store from application config.
+
+        Args:
+            config: Flask config mapping
+
+        Returns:
+            SessionStore instance
+        """
+        return cls(
+            ttl_seconds=config['SESSION_TTL_SECONDS'],
+            max_sessions=config['SESSION_MAX_SESSIONS'],
+            max_bytes=int(config['SESSION_MEMORY_MB'] * 1024 * 1024),
+            max_turns=config['SESSION_MAX_TURNS'],
+            history_tokens=config['SESSION_HISTORY_TOKENS'],
+            answer_chars=config['SESSION_ANSWER_CHARS'],
+        )
+
+    def _drop(self, session_id: str) -> None:
+        """Remove a session (lock held)"""
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def _prune(self) -> None:
+        """Drop expired sessions, then LRU sessions over the caps (lock held)"""
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.ttl_seconds:
+                break
+            self._drop(session_id)
+            metrics.increment("sessions.expired")
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)))
+            metrics.increment("sessions.evicted")
+        metrics.gauge("sessions.active", len(self._sessions))
+        metrics.gauge("sessions.bytes", self._bytes)
+
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        """
+        Get the most recent turns that fit in the history token budget.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            List of (question, answer) pairs, oldest first
+        """
+        with self._lock:
+            self._prune()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            turns = list(session.turns)
+
+        budget = self.history_tokens * CHARS_PER_TOKEN
+        selected = []
+        for question, answer in reversed(turns):
+            budget -= len(question) + len(answer)
+            if budget < 0:
+                break
+            selected.append((question, answer))
+        return selected[::-1]
+
+    def append(self, session_id: str, question: str, answer: str) -> None:
+        """
+        Record a turn.
+
+        Args:
+            session_id: Session identifier
+            question: User query
+            answer: Assistant answer (truncated to answer_chars)
+        """
+        if len(answer) > self.answer_chars:
+            answer = answer[:self.answer_chars].rsplit(' ', 1)[0] + ' ...'
+        size = len(question.encode('utf-8')) + len(answer.encode('utf-8'))
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            else:
+                self._sessions.move_to_end(session_id)
+            if len(session.turns) == session.turns.maxlen:
+                old_question, old_answer = session.turns[0]
+                removed = len(old_question.encode('utf-8')) + len(old_answer.encode('utf-8'))
+                session.size -= removed
+                self._bytes -= removed
+            session.turns.append((question, answer))
+            session.size += size
+            self._bytes += size
+            session.last_used = time.monotonic()
+            self._prune()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+def rewrite_followup(query: str, history: List[Tuple[str, str]]) -> str:
+    """
+    Turn a follow-up question into a standalone retrieval query.
+
+    Short questions, questions opening with "and", "what about" etc., and
+    questions referring back with "it", "they" etc. get the content words of the previous
+    question appended, e.g. "and what dose for a calf?" after "What is the
+    ivermectin dose for cows?" becomes "and what dose for a calf? ivermectin cows".
+
+    Args:
+        query: Current user query
+        history: Previous (question, answer) turns, oldest first
+
+    Returns:
+        Query to use for retrieval (unchanged if it is not a follow-up)
+    """
+    if not history:
+        return query
+    lowered = query.lower().lstrip()
+    terms = tokenize(query)
+    is_followup = (
+        len(terms) <= _FOLLOWUP_MAX_TERMS
+        or lowered.startswith(_FOLLOWUP_OPENERS)
+        or any(word in _REFERENCE_WORDS for word in _WORD_RE.findall(lowered))
+    )
+    if not is_followup:
+        return query
+    missing = [term for term in dict.fromkeys(tokenize(history[-1][0])) if term not in terms]
+    if not missing:
+        return query
+    return f"{query} {' '.join(missing)}"
@@ -3,32 +3,114 @@ Vector Store Service
 
 Handles FAISS vectorstore creation, loading, and management.
 """
+import hashlib
+import json
 import os
-from typing import List
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
 from langchain_community.document_loaders import Docx2txtLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
-from app.core.config import get_config
+from app.core.config import get_collection_config
+from app.core.constants import QUANTIZATION_NONE
 from app.core.exceptions import VectorStoreError, DocumentLoadError
+from app.services.backend_pool import PooledEmbeddings, get_backend_pool
+from app.services.quantized_index import (
+    VECTORS_FILE, QuantizedFAISS, quantize_index, recall_at_k, rerank_search
+)
+from app.utils.chunking import StructureAwareSplitter
+from app.utils.dedup import remove_near_duplicates
+from app.utils.http_client import build_client_kwargs
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Number of stored vectors used as queries for the build-time recall check
+RECALL_SAMPLE_SIZE = 100
+
+# Modification time and size of each indexed file, saved with the index
+SOURCES_FILE = 'sources.json'
+
+# Embeddings of finished batches, kept in VECTOR_DIR + CHECKPOINT_SUFFIX
+# until the build completes so an interrupted build can resume: one shard
+# file per batch plus a manifest naming the embedding model and dimension
+CHECKPOINT_SUFFIX = '.checkpoint'
+CHECKPOINT_MANIFEST = 'manifest.json'
+
+# Each saved index lives in VECTOR_DIR + '.v<ns>'; VECTOR_DIR is a symlink
+# to the current version, replaced atomically on publish
+VERSION_SUFFIX = '.v'
+
 
 class VectorStoreService:
     """Service class for managing FAISS vectorstore operations"""
     
-    def __init__(self, config_name='development'):
-        """Initialize the vector store service"""
-        self.config = get_config(config_name)()
-        self.embeddings = OllamaEmbeddings(model=self.config.EMBED_MODEL)
+    def __init__(self, config_name='development', collection=None):
+        """
+        Initialize the vector store service.
+        
+        Args:
+            config_name: Configuration environment
+            collection: Collection whose data/index directories to use
+                (None for the default collection)
+        """
+        self.config = get_collection_config(config_name, collection)
+        self.embeddings = PooledEmbeddings(
+            get_backend_pool(self.config),
+            self._create_embeddings,
+            ("embed", self.config.EMBED_MODEL)
+        )
         self._vectorstore = None
+        self.last_build_report = {}
+        self.indexed_sources = {}
+        self._build_lock = threading.Lock()
+    
+    def _create_embeddings(self, base_url: str) -> OllamaEmbeddings:
+        """
+        Create the embeddings client for one backend.
+        
+        Args:
+            base_url: Ollama host the client talks to
+        
+        Returns:
+            Configured OllamaEmbeddings instance
+        """
+        return OllamaEmbeddings(
+            model=self.config.EMBED_MODEL,
+            base_url=base_url,
+            client_kwargs=build_client_kwargs(self.config)
+        )
     
-    def _load_documents(self) -> List:
+    def list_source_files(self) -> Dict[str, list]:
         """
-        Load all DOCX documents from the data directory.
+        List the DOCX files in the data directory.
+        
+        Returns:
+            Mapping of filename to [modification time (ns), size]
+        """
+        if not os.path.exists(self.config.DATA_DIR):
+            return {}
+        sources = {}
+        for filename in os.listdir(self.config.DATA_DIR):
+            if filename.endswith(('.docx', '.doc')):
+                stat = os.stat(os.path.join(self.config.DATA_DIR, filename))
+                sources[filename] = [stat.st_mtime_ns, stat.st_size]
+        return sources
+    
+    def _load_documents(self, filenames: Optional[List[str]] = None) -> List:
+        """
+        Load DOCX documents from the data directory.
+        
+        Args:
+            filenames: Files to load (None for all DOCX files)
         
         Returns:
             List of loaded documents
@@ -41,8 +123,7 @@ class VectorStoreService:
         if not os.path.exists(self.config.DATA_DIR):
             raise DocumentLoadError(f"Data directory not found: {self.config.DATA_DIR}")
         
-        doc_files = [f for f in os.listdir(self.config.DATA_DIR) 
-                     if f.endswith(('.docx', '.doc'))]
+        doc_files = filenames if filenames is not None else list(self.list_source_files())
         
         if not doc_files:
             raise DocumentLoadError("No DOCX files found in data directory")
@@ -50,41 +131,323 @@ class VectorStoreService:
         for filename in doc_files:
             path = os.path.join(self.config.DATA_DIR, filename)
             try:
-                logger.info(f"Loading document: {filename}")
+                logger.info("Loading document: %s", filename)
                 loader = Docx2txtLoader(path)
                 all_docs.extend(loader.load())
             except Exception as e:
-                logger.error(f"Error loading {filename}: {str(e)}")
+                logger.error("Error loading %s: %s", filename, e)
                 raise DocumentLoadError(f"Failed to load {filename}: {str(e)}")
         
         if not all_docs:
             raise DocumentLoadError("No documents could be loaded")
         
-        logger.info(f"Successfully loaded {len(all_docs)} document(s)")
+        logger.info("Successfully loaded %s document(s)", len(all_docs))
         return all_docs
     
-    def _split_documents(self, docs: List) -> List:
+    def _split_documents(self, docs: List, existing: Optional[List] = None) -> List:
         """
-        Split documents into chunks.
+        Split documents into chunks and drop near-duplicate chunks.
+        
+        With CHUNK_STRATEGY=structure, chunks follow section headings and
+        question/answer boundaries; otherwise a recursive character splitter
+        with CHUNK_OVERLAP is used. The chunk/byte savings are stored in
+        last_build_report.
         
         Args:
             docs: List of documents to split
+            existing: Chunks already in the index (incremental updates); new
+                chunks duplicating them are dropped too
         
         Returns:
             List of document chunks
         """
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.config.CHUNK_SIZE,
-            chunk_overlap=self.config.CHUNK_OVERLAP
-        )
-        splits = text_splitter.split_documents(docs)
-        logger.info(f"Split documents into {len(splits)} chunks")
+        existing = existing or []
+        dedup_distance = self.config.DEDUP_MAX_DISTANCE if self.config.DEDUP_ENABLED else None
+        source_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in docs)
+        
+        if self.config.CHUNK_STRATEGY == 'structure':
+            # Duplicates are removed per question/answer unit before packing
+            text_splitter = StructureAwareSplitter(
+                chunk_size=self.config.CHUNK_SIZE,
+                chunk_overlap=self.config.CHUNK_OVERLAP,
+                dedup_max_distance=dedup_distance
+            )
+            splits = text_splitter.split_documents(docs, existing=existing)
+            removed = text_splitter.removed_units
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.config.CHUNK_SIZE,
+                chunk_overlap=self.config.CHUNK_OVERLAP
+            )
+            splits = text_splitter.split_documents(docs)
+            removed = []
+            if dedup_distance is not None:
+                splits, removed = remove_near_duplicates(
+                    splits, max_distance=dedup_distance, existing=existing
+                )
+        
+        chunk_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in splits)
+        removed_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in removed)
+        self.last_build_report = {
+            "chunk_strategy": self.config.CHUNK_STRATEGY,
+            "source_bytes": source_bytes,
+            "chunks": len(splits),
+            "chunk_bytes": chunk_bytes,
+            "duplicates_removed": len(removed),
+            "duplicate_bytes_removed": removed_bytes,
+            "bytes_saved_vs_source": source_bytes - chunk_bytes,
+        }
+        logger.info("Split documents into %s chunks (%s bytes); removed %s near-duplicates (%s bytes)",
+                    len(splits), chunk_bytes, len(removed), removed_bytes)
         return splits
     
-    def build_vectorstore(self) -> FAISS:
+    def _save(self, vectorstore: FAISS) -> None:
+        """
+        Write the index, build report and source list to VECTOR_DIR.
+        
+        Files are written to a new version directory that is then
+        published (see _publish), so readers never see a half-written or
+        missing index.
+        
+        Args:
+            vectorstore: Vectorstore to save
+        """
+        target = self.config.VECTOR_DIR
+        staging = f"{target}{VERSION_SUFFIX}{time.time_ns()}"
+        
+        vectorstore.save_local(staging)
+        if isinstance(vectorstore, QuantizedFAISS) and vectorstore.rerank_vectors is not None:
+            np.save(os.path.join(staging, VECTORS_FILE), vectorstore.rerank_vectors)
+        with open(os.path.join(staging, 'build_report.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.last_build_report, f, indent=2)
+        with open(os.path.join(staging, SOURCES_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.indexed_sources, f, indent=2)
+        self._publish(staging)
+    
+    def _publish(self, version_dir: str) -> None:
+        """
+        Point VECTOR_DIR at a saved version with one atomic rename.
+        
+        A new symlink replaces the old one via os.replace, so other
+        processes always find a complete index at VECTOR_DIR. The previous
+        version is kept for readers that are still loading it; older ones
+        are deleted. An index saved before versioning (a plain directory)
+        is moved aside once.
+        
+        Args:
+            version_dir: Directory written by _save
+        """
+        target = self.config.VECTOR_DIR
+        previous = os.path.realpath(target) if os.path.islink(target) else None
+        if os.path.isdir(target) and not os.path.islink(target):
+            os.rename(target, f"{target}{VERSION_SUFFIX}0")
+            previous = os.path.realpath(f"{target}{VERSION_SUFFIX}0")
+        
+        link = target + '.link'
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(version_dir), link)
+        os.replace(link, target)
+        
+        parent, name = os.path.split(target)
+        keep = {os.path.realpath(version_dir), previous}
+        for entry in os.listdir(parent or '.'):
+            suffix = entry[len(name) + len(VERSION_SUFFIX):]
+            path = os.path.realpath(os.path.join(parent, entry))
+            if (entry.startswith(name + VERSION_SUFFIX) and suffix.isdigit()
+                    and path not in keep):
+                shutil.rmtree(path, ignore_errors=True)
+    
+    def _read_sources(self) -> Dict[str, list]:
+        """Source list saved with the index (current files for older indexes)"""
+        path = os.path.join(self.config.VECTOR_DIR, SOURCES_FILE)
+        if not os.path.exists(path):
+            return self.list_source_files()
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _quantize(self, vectorstore: FAISS) -> QuantizedFAISS:
+        """
+        Replace the flat index with a compressed one (INDEX_QUANTIZATION).
+        
+        Recall@k of the compressed index, with and without exact re-ranking,
+        is measured against the flat index and added to last_build_report.
+        
+        Args:
+            vectorstore: Vectorstore with a flat float32 index
+        
+        Returns:
+            Vectorstore using the compressed index; its float vectors are
+            kept in memory until they are saved and memory-mapped
+        """
+        flat = vectorstore.index
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+        index = quantize_index(vectors, self.config.INDEX_QUANTIZATION, flat.metric_type,
+                               self.config.PQ_M, self.config.PQ_NBITS)
+        
+        k = min(self.config.RETRIEVER_K, flat.ntotal)
+        factor = self.config.QUANTIZATION_RERANK_FACTOR
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(RECALL_SAMPLE_SIZE, len(vectors)), replace=False)]
+        recall = recall_at_k(flat, lambda q, n: index.search(q.reshape(1, -1), n)[1][0], sample, k)
+        recall_reranked = recall_at_k(
+            flat, lambda q, n: rerank_search(index, vectors, q, n, factor, flat.metric_type)[1],
+            sample, k
+        )
+        served_recall = recall_reranked if self.config.QUANTIZATION_RERANK else recall
+        
+        self.last_build_report.update({
+            "quantization": self.config.INDEX_QUANTIZATION,
+            "index_bytes": index.ntotal * index.code_size,
+            "float_index_bytes": vectors.nbytes,
+            "recall_k": k,
+            "recall_at_k": round(recall, 4),
+            "recall_at_k_reranked": round(recall_reranked, 4),
+        })
+        logger.info("Quantized index (%s): %s -> %s bytes, recall@%s %.3f (%.3f re-ranked)",
+                    self.config.INDEX_QUANTIZATION, vectors.nbytes, index.ntotal * index.code_size,
+                    k, recall, recall_reranked)
+        if served_recall < self.config.QUANTIZATION_MIN_RECALL:
+            logger.warning("Quantized index recall@%s %.3f is below QUANTIZATION_MIN_RECALL %.3f",
+                           k, served_recall, self.config.QUANTIZATION_MIN_RECALL)
+        
+        quantized = QuantizedFAISS(
+            vectorstore.embedding_function,
+            index,
+            vectorstore.docstore,
+            vectorstore.index_to_docstore_id,
+            distance_strategy=vectorstore.distance_strategy,
+        )
+        quantized.rerank_vectors = vectors
+        return quantized
+    
+    def _attach_rerank_vectors(self, vectorstore: QuantizedFAISS) -> None:
+        """Memory-map the saved float vectors for exact re-ranking, if enabled"""
+        path = os.path.join(self.config.VECTOR_DIR, VECTORS_FILE)
+        if self.config.QUANTIZATION_RERANK and os.path.exists(path):
+            vectorstore.rerank_vectors = np.load(path, mmap_mode='r')
+            vectorstore.rerank_factor = self.config.QUANTIZATION_RERANK_FACTOR
+        else:
+            vectorstore.rerank_vectors = None
+    
+    def _load_checkpoint(self, checkpoint_dir: str) -> Dict[str, np.ndarray]:
+        """
+        Embeddings saved by an earlier, interrupted build, keyed by chunk hash.
+        
+        A checkpoint written with another EMBED_MODEL is discarded. Shards
+        that cannot be read or do not match the manifest dimension are
+        skipped (their chunks are embedded again).
+        """
+        if not os.path.isdir(checkpoint_dir):
+            return {}
+        manifest_path = os.path.join(checkpoint_dir, CHECKPOINT_MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        if manifest.get("embed_model") != self.config.EMBED_MODEL:
+            logger.warning("Discarding checkpoint in %s: not built with %s",
+                           checkpoint_dir, self.config.EMBED_MODEL)
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+            return {}
+        
+        done = {}
+        for name in sorted(os.listdir(checkpoint_dir)):
+            if not (name.startswith('shard-') and name.endswith('.npz')):
+                continue
+            try:
+                with np.load(os.path.join(checkpoint_dir, name)) as shard:
+                    hashes, vectors = shard['hashes'], shard['vectors']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring unreadable checkpoint shard %s: %s", name, e)
+                continue
+            if (vectors.ndim != 2 or len(vectors) != len(hashes)
+                    or vectors.shape[1] != manifest.get("dimension")):
+                logger.warning("Ignoring inconsistent checkpoint shard %s", name)
+                continue
+            done.update(zip(hashes.tolist(), vectors))
+        return done
+    
+    def _write_checkpoint(self, checkpoint_dir: str, hashes: List[str],
+                          vectors: np.ndarray) -> None:
+        """
+        Save one finished batch as a new shard.
+        
+        Hashes and vectors share one file, which is written under a
+        temporary name and renamed, so a crash never leaves them out of sync.
+        """
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        manifest_path = os.path.join(checkpoint_dir, CHECKPOINT_MANIFEST)
+        if not os.path.exists(manifest_path):
+            with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({"embed_model": self.config.EMBED_MODEL,
+                           "dimension": int(vectors.shape[1])}, f)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        
+        shard_path = os.path.join(checkpoint_dir, f"shard-{time.time_ns()}.npz")
+        with open(shard_path + '.tmp', 'wb') as f:
+            np.savez(f, hashes=np.array(hashes), vectors=vectors)
+        os.replace(shard_path + '.tmp', shard_path)
+    
+    def _embed_chunks(self, splits: List, batch_size: int) -> np.ndarray:
+        """
+        Embed chunks in batches, checkpointing after each batch.
+        
+        Chunks already in the checkpoint of an interrupted build (matched by
+        content hash, same EMBED_MODEL) are not embedded again. If the model
+        now returns vectors of another dimension, the checkpoint is discarded
+        and every chunk is embedded again.
+        
+        Args:
+            splits: Document chunks
+            batch_size: Chunks per embedding request
+        
+        Returns:
+            float32 array with one embedding per chunk
+        """
+        checkpoint_dir = self.config.VECTOR_DIR + CHECKPOINT_SUFFIX
+        done = self._load_checkpoint(checkpoint_dir)
+        hashes = [
+            hashlib.blake2b(doc.page_content.encode('utf-8'), digest_size=16).hexdigest()
+            for doc in splits
+        ]
+        todo = [i for i, h in enumerate(hashes) if h not in done]
+        if len(todo) < len(splits):
+            logger.info("Resuming build: %s of %s chunks already embedded",
+                        len(splits) - len(todo), len(splits))
+        self.last_build_report["chunks_resumed"] = len(splits) - len(todo)
+        dimension = len(next(iter(done.values()))) if done else None
+        
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            vectors = np.asarray(
+                self.embeddings.embed_documents([splits[i].page_content for i in batch]),
+                dtype=np.float32
+            )
+            if dimension is not None and vectors.shape[1] != dimension:
+                logger.warning("Embedding dimension changed (%s -> %s); discarding checkpoint",
+                               dimension, vectors.shape[1])
+                shutil.rmtree(checkpoint_dir, ignore_errors=True)
+                return self._embed_chunks(splits, batch_size)
+            dimension = vectors.shape[1]
+            batch_hashes = [hashes[i] for i in batch]
+            done.update(zip(batch_hashes, vectors))
+            self._write_checkpoint(checkpoint_dir, batch_hashes, vectors)
+            logger.info("Embedded %s/%s chunks", min(start + batch_size, len(todo)), len(todo))
+        
+        return np.array([done[h] for h in hashes], dtype=np.float32)
+    
+    def build_vectorstore(self, batch_size: Optional[int] = None) -> FAISS:
         """
         Build a new FAISS vectorstore from documents.
         
+        Embeddings are checkpointed per batch, so an interrupted build
+        resumes where it stopped. Per-stage timings are recorded in
+        last_build_report.
+        
+        Args:
+            batch_size: Chunks per embedding request (default EMBED_BATCH_SIZE)
+        
         Returns:
             FAISS vectorstore instance
         
@@ -93,23 +456,52 @@ class VectorStoreService:
         """
         try:
             logger.info("Building new vectorstore...")
+            timings = {}
+            
+            def timed(stage, started):
+                timings[stage] = round((time.perf_counter() - started) * 1000, 1)
             
             # Load and split documents
+            started = time.perf_counter()
+            sources = self.list_source_files()
             docs = self._load_documents()
+            timed("load_ms", started)
+            
+            started = time.perf_counter()
             splits = self._split_documents(docs)
+            timed("split_ms", started)
             
             # Create vectorstore
-            vectorstore = FAISS.from_documents(splits, self.embeddings)
+            started = time.perf_counter()
+            vectors = self._embed_chunks(splits, batch_size or self.config.EMBED_BATCH_SIZE)
+            timed("embed_ms", started)
+            
+            started = time.perf_counter()
+            vectorstore = FAISS.from_embeddings(
+                zip([doc.page_content for doc in splits], vectors.tolist()),
+                self.embeddings,
+                metadatas=[doc.metadata for doc in splits]
+            )
+            if self.config.INDEX_QUANTIZATION != QUANTIZATION_NONE:
+                vectorstore = self._quantize(vectorstore)
+            timed("index_ms", started)
             
             # Save to disk
-            vectorstore.save_local(self.config.VECTOR_DIR)
-            logger.info(f"Vectorstore saved to {self.config.VECTOR_DIR}")
+            started = time.perf_counter()
+            self.indexed_sources = sources
+            self.last_build_report["timings_ms"] = timings
+            self._save(vectorstore)
+            if isinstance(vectorstore, QuantizedFAISS):
+                self._attach_rerank_vectors(vectorstore)
+            shutil.rmtree(self.config.VECTOR_DIR + CHECKPOINT_SUFFIX, ignore_errors=True)
+            timed("write_ms", started)
+            logger.info("Vectorstore saved to %s (timings: %s)", self.config.VECTOR_DIR, timings)
             
             self._vectorstore = vectorstore
             return vectorstore
             
         except (DocumentLoadError, Exception) as e:
-            logger.error(f"Failed to build vectorstore: {str(e)}")
+            logger.error("Failed to build vectorstore: %s", e)
             raise VectorStoreError(f"Failed to build vectorstore: {str(e)}")
     
     def load_vectorstore(self) -> FAISS:
@@ -124,22 +516,29 @@ class VectorStoreService:
         """
         try:
             if not os.path.exists(self.config.VECTOR_DIR):
+                if not self.config.INDEX_BUILD_ON_DEMAND:
+                    raise VectorStoreError(
+                        f"Index not found at {self.config.VECTOR_DIR}; "
+                        "build it with python -m app.build_index"
+                    )
                 logger.warning("Vectorstore not found, building new one...")
                 return self.build_vectorstore()
             
-            logger.info(f"Loading vectorstore from {self.config.VECTOR_DIR}")
-            vectorstore = FAISS.load_local(
+            logger.info("Loading vectorstore from %s", self.config.VECTOR_DIR)
+            vectorstore = QuantizedFAISS.load_local(
                 self.config.VECTOR_DIR,
                 self.embeddings,
                 allow_dangerous_deserialization=True
             )
+            self._attach_rerank_vectors(vectorstore)
+            self.indexed_sources = self._read_sources()
             
             self._vectorstore = vectorstore
             logger.info("Vectorstore loaded successfully")
             return vectorstore
             
         except Exception as e:
-            logger.error(f"Failed to load vectorstore: {str(e)}")
+            logger.error("Failed to load vectorstore: %s", e)
             raise VectorStoreError(f"Failed to load vectorstore: {str(e)}")
     
     def get_vectorstore(self) -> FAISS:
@@ -153,6 +552,33 @@ class VectorStoreService:
             return self.load_vectorstore()
         return self._vectorstore
     
+    def memory_footprint(self) -> int:
+        """
+        Estimate the RAM held by the loaded index and chunk store.
+        
+        Returns:
+            Approximate size in bytes (0 if nothing is loaded)
+        """
+        if self._vectorstore is None:
+            return 0
+        index = self._vectorstore.index
+        code_size = getattr(index, 'code_size', index.d * 4)
+        text_size = sum(
+            len(doc.page_content.encode('utf-8'))
+            for doc in self._vectorstore.docstore._dict.values()
+        )
+        return index.ntotal * code_size + text_size
+    
+    def get_chunk_texts(self) -> List[str]:
+        """
+        Get the text of every chunk in the loaded vectorstore.
+        
+        Returns:
+            List of chunk texts
+        """
+        vectorstore = self.get_vectorstore()
+        return [doc.page_content for doc in vectorstore.docstore._dict.values()]
+    
     def rebuild_vectorstore(self) -> None:
         """
         Rebuild the vectorstore from scratch.
@@ -161,5 +587,81 @@ class VectorStoreService:
             VectorStoreError: If rebuild fails
         """
         logger.info("Rebuilding vectorstore...")
-        self._vectorstore = None
-        self.build_vectorstore()
+        # The current index keeps serving until the new one replaces it
+        with self._build_lock:
+            self.build_vectorstore()
+    
+    def update_files(self, changed: List[str], removed: List[str]) -> FAISS:
+        """
+        Re-index only the given files and swap in the updated index.
+        
+        Chunks of changed and removed files are deleted from a copy of the
+        live index, chunks of changed files are embedded and added, and the
+        copy replaces the live index once it is saved. Quantized indexes
+        cannot be updated in place and are rebuilt instead.
+        
+        Args:
+            changed: Added or modified filenames in DATA_DIR
+            removed: Filenames deleted from DATA_DIR
+        
+        Returns:
+            The updated vectorstore
+        
+        Raises:
+            VectorStoreError: If the update fails
+        """
+        with self._build_lock:
+            if (self.config.INDEX_QUANTIZATION != QUANTIZATION_NONE
+                    or not os.path.exists(self.config.VECTOR_DIR)):
+                return self.build_vectorstore()
+            
+            try:
+                current = self.get_vectorstore()
+                sources = self.list_source_files()
+                changed = [name for name in changed if name in sources]
+                stale = {os.path.join(self.config.DATA_DIR, name) for name in changed + removed}
+                stale_ids, kept_chunks = [], []
+                for doc_id, doc in current.docstore._dict.items():
+                    if doc.metadata.get('source') in stale:
+                        stale_ids.append(doc_id)
+                    else:
+                        kept_chunks.append(doc)
+                new_chunks = (
+                    self._split_documents(self._load_documents(changed), existing=kept_chunks)
+                    if changed else []
+                )
+                
+                # Work on a copy so queries keep using the current index
+                vectorstore = QuantizedFAISS(
+                    current.embedding_function,
+                    faiss.clone_index(current.index),
+                    InMemoryDocstore(dict(current.docstore._dict)),
+                    dict(current.index_to_docstore_id),
+                    distance_strategy=current.distance_strategy,
+                )
+                if stale_ids:
+                    vectorstore.delete(stale_ids)
+                if new_chunks:
+                    vectorstore.add_documents(new_chunks)
+                
+                indexed_sources = {
+                    name: stat for name, stat in self.indexed_sources.items()
+                    if name not in removed
+                }
+                indexed_sources.update({name: sources[name] for name in changed})
+                self.last_build_report = dict(
+                    self.last_build_report, incremental=True,
+                    files_changed=changed, files_removed=removed,
+                    chunks_deleted=len(stale_ids), chunks_added=len(new_chunks),
+                )
+                self.indexed_sources = indexed_sources
+                self._save(vectorstore)
+                
+                self._vectorstore = vectorstore
+                logger.info("Re-indexed %s changed and %s removed file(s): -%s/+%s chunks",
+                            len(changed), len(removed), len(stale_ids), len(new_chunks))
+                return vectorstore
+            
+            except Exception as e:
+                logger.error("Failed to update vectorstore: %s", e)
+                raise VectorStoreError(f"Failed to update vectorstore: {str(e)}")
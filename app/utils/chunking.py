@@ -0,0 +1,154 @@
+"""
+Structure-aware Chunking
+
+Splits extension documents at section headings and question boundaries
+(``Q12. ...``) and packs whole question/answer units into chunks, so chunk
+edges fall between units and no overlap is needed to keep answers intact.
+"""
+import re
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.utils.dedup import remove_near_duplicates
+
+
+# Start of a numbered question, e.g. "Q12." or "Q 12)"
+_QUESTION_RE = re.compile(r'^\s*Q\s*\d+\s*[.):]', re.IGNORECASE)
+
+# Section headings are short titles made of words, e.g. "Nutrition & Feeding"
+_HEADING_RE = re.compile(r'^[A-Za-z][A-Za-z &/,-]*$')
+_MAX_HEADING_WORDS = 6
+
+
+# Start of an answer, e.g. "Ans." or "Answer:"
+_ANSWER_RE = re.compile(r'^\s*Ans', re.IGNORECASE)
+
+
+def _is_heading(prev_line: str, line: str, next_line: str) -> bool:
+    """
+    A short title line that introduces a question, e.g. 'Management and
+    reproduction' followed by 'Q1. ...'. Short answers ('Ans. Cobalt', or a
+    bare value right after its question) are excluded.
+    """
+    return (
+        bool(_HEADING_RE.match(line))
+        and len(line.split()) <= _MAX_HEADING_WORDS
+        and not _ANSWER_RE.match(line)
+        and not _QUESTION_RE.match(prev_line)
+        and bool(_QUESTION_RE.match(next_line))
+    )
+
+
+def split_units(text: str) -> List[tuple]:
+    """
+    Split text into (section heading, unit text) pairs.
+
+    A unit is one question with its answer, or a run of text between
+    boundaries when the document is not in question/answer form.
+
+    Args:
+        text: Document text
+
+    Returns:
+        List of (heading, unit) tuples
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    units = []
+    heading = ''
+    current = []
+
+    for i, line in enumerate(lines):
+        prev_line = lines[i - 1] if i > 0 else ''
+        next_line = lines[i + 1] if i + 1 < len(lines) else ''
+        is_heading = _is_heading(prev_line, line, next_line)
+        if (is_heading or _QUESTION_RE.match(line)) and current:
+            units.append((heading, '\n'.join(current)))
+            current = []
+        if is_heading:
+            heading = line
+        else:
+            current.append(line)
+    if current:
+        units.append((heading, '\n'.join(current)))
+    return units
+
+
+class StructureAwareSplitter:
+    """Pack question/answer units into chunks of at most chunk_size characters"""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int,
+                 dedup_max_distance: Optional[int] = None):
+        """
+        Initialize the splitter.
+
+        Args:
+            chunk_size: Maximum chunk length in characters
+            chunk_overlap: Overlap used only when a single unit is too long
+            dedup_max_distance: If set, drop units that are near-duplicates
+                (SimHash distance) of an earlier unit before packing
+        """
+        self.chunk_size = chunk_size
+        self.dedup_max_distance = dedup_max_distance
+        self.removed_units: List[Document] = []
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+
+    def split_documents(self, docs: List[Document],
+                        existing: Sequence[Document] = ()) -> List[Document]:
+        """
+        Split documents into chunks along their structure.
+
+        Args:
+            docs: Documents to split
+            existing: Chunks already indexed; units duplicating one of their
+                units are dropped as well
+
+        Returns:
+            List of chunks carrying the source metadata and section heading
+        """
+        chunks = []
+        units = [
+            Document(page_content=unit, metadata=dict(doc.metadata, section=heading))
+            for doc in docs
+            for heading, unit in split_units(doc.page_content)
+        ]
+        if self.dedup_max_distance is not None:
+            existing_units = [
+                Document(page_content=unit)
+                for chunk in existing
+                for _, unit in split_units(chunk.page_content)
+            ]
+            units, self.removed_units = remove_near_duplicates(
+                units, max_distance=self.dedup_max_distance, existing=existing_units
+            )
+
+        buffer, buffer_metadata = [], None
+        size = 0
+
+        def emit():
+            if buffer:
+                chunks.append(Document(page_content='\n\n'.join(buffer),
+                                       metadata=buffer_metadata))
+
+        for unit in units:
+            text = unit.page_content
+            if len(text) > self.chunk_size:
+                emit()
+                buffer, size = [], 0
+                for piece in self._fallback.split_text(text):
+                    chunks.append(Document(page_content=piece, metadata=unit.metadata))
+                continue
+            # Start a new chunk at document/section changes or when the unit won't fit
+            if buffer and (unit.metadata != buffer_metadata
+                           or size + len(text) + 2 > self.chunk_size):
+                emit()
+                buffer, size = [], 0
+            if not buffer:
+                buffer_metadata = unit.metadata
+            buffer.append(text)
+            size += len(text) + 2
+        emit()
+        return chunks
@@ -0,0 +1,126 @@
+"""
+Near-duplicate Detection
+
+64-bit SimHash fingerprints over word shingles. Candidate pairs are found
+through banding: with 4 bands of 16 bits, any two fingerprints within
+Hamming distance 3 share at least one identical band.
+
+Every word and number counts towards the fingerprint (no stopword or
+short-token filtering), and texts whose numbers differ are never treated
+as duplicates: "Give 5 ml per 10 kg" and "Give 2 ml per 50 kg" are
+different dosages, not copies. Enumeration markers such as "Q4." or
+"2)" at the start of a line are ignored.
+"""
+import hashlib
+import re
+from typing import List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+_TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_MARKER_RE = re.compile(r"^[ \t]*(?:q(?:uestion)?[ \t]*)?\d+[.):][ \t]+", re.IGNORECASE | re.MULTILINE)
+
+_BITS = 64
+_BANDS = 4
+_BAND_BITS = _BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def _hash64(text: str) -> int:
+    """Stable 64-bit hash (Python's hash() is randomized per process)"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _tokens(text: str) -> List[str]:
+    """Lowercase words and numbers, including short tokens like 'ml' or '5'"""
+    return _TOKEN_RE.findall(_MARKER_RE.sub('', text).lower())
+
+
+def numbers(text: str) -> Tuple[str, ...]:
+    """Numeric tokens of a text, in order"""
+    return tuple(_NUMBER_RE.findall(_MARKER_RE.sub('', text)))
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    Compute the SimHash fingerprint of a text.
+
+    Args:
+        text: Input text
+        shingle_size: Number of consecutive words per feature
+
+    Returns:
+        64-bit fingerprint
+    """
+    tokens = _tokens(text)
+    if len(tokens) < shingle_size:
+        shingles = [' '.join(tokens)]
+    else:
+        shingles = [' '.join(tokens[i:i + shingle_size])
+                    for i in range(len(tokens) - shingle_size + 1)]
+
+    weights = [0] * _BITS
+    for shingle in shingles:
+        value = _hash64(shingle)
+        for bit in range(_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return bin(a ^ b).count('1')
+
+
+def remove_near_duplicates(docs: List[Document], max_distance: int = 3,
+                           existing: Sequence[Document] = ()) -> Tuple[List[Document], List[Document]]:
+    """
+    Drop documents whose SimHash is within max_distance of an earlier one
+    and whose numbers are identical to it.
+
+    The first occurrence is kept; documents that duplicate one of
+    ``existing`` (e.g. chunks already in the index) are removed too.
+    max_distance must be below the number of
+    bands (4) for the banded lookup to find every near-duplicate.
+
+    Args:
+        docs: Chunks in document order
+        max_distance: Largest Hamming distance treated as a duplicate
+        existing: Documents that are already kept
+
+    Returns:
+        Tuple of (kept documents, removed documents)
+    """
+    if max_distance >= _BANDS:
+        raise ValueError(f"max_distance must be below {_BANDS}")
+
+    buckets = [{} for _ in range(_BANDS)]
+
+    def register(fingerprint, doc_numbers, bands):
+        for band, key in enumerate(bands):
+            buckets[band].setdefault(key, []).append((fingerprint, doc_numbers))
+
+    def features(doc):
+        fingerprint = simhash(doc.page_content)
+        bands = [(fingerprint >> (band * _BAND_BITS)) & _BAND_MASK for band in range(_BANDS)]
+        return fingerprint, numbers(doc.page_content), bands
+
+    for doc in existing:
+        register(*features(doc))
+
+    kept, removed = [], []
+    for doc in docs:
+        fingerprint, doc_numbers, bands = features(doc)
+        duplicate = any(
+            other_numbers == doc_numbers and hamming_distance(fingerprint, other) <= max_distance
+            for band, key in enumerate(bands)
+            for other, other_numbers in buckets[band].get(key, ())
+        )
+        if duplicate:
+            removed.append(doc)
+            continue
+
+        kept.append(doc)
+        register(fingerprint, doc_numbers, bands)
+    return kept, removed
@@ -1,10 +1,25 @@
 """
 Helper Utilities
 """
+import re
 from typing import List
 from langchain_core.documents import Document
 
 
+# Common English words ignored when matching query terms against the corpus
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers him his how i if
+in into is it its itself just me more most my no nor not now of off on once only
+or other our out over own same she should so some such than that the their them
+then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
 def format_documents(docs: List[Document]) -> str:
     """
     Format a list of LangChain documents into a single string.
@@ -18,6 +33,22 @@ def format_documents(docs: List[Document]) -> str:
     return "\n\n".join(doc.page_content for doc in docs)
 
 
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase content words (stopwords and 1-2 letter words removed).
+    
+    Args:
+        text: Input text
+    
+    Returns:
+        List of tokens
+    """
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+
+
 def validate_query(query: str) -> tuple[bool, str]:
     """
     Validate user query.
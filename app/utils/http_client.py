@@ -0,0 +1,83 @@
+"""
+HTTP Client Settings
+
+Shared connection pool, keep-alive and timeout settings for the Ollama
+clients, plus the retry budget used by the backend pool.
+"""
+import threading
+
+import httpx
+
+
+# Errors raised before a request reached the backend; safe to retry elsewhere
+RETRYABLE_ERRORS = (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout,
+                    httpx.PoolTimeout)
+
+
+def build_client_kwargs(config, read_timeout: float = None) -> dict:
+    """
+    Build keyword arguments for the httpx clients created by langchain_ollama.
+
+    Passed as ``client_kwargs`` to both ChatOllama and OllamaEmbeddings so
+    every Ollama client shares the same pool size, keep-alive and timeouts.
+
+    Args:
+        config: Configuration object
+        read_timeout: Overrides OLLAMA_READ_TIMEOUT (e.g. a route's latency budget)
+
+    Returns:
+        Dictionary of httpx client keyword arguments
+    """
+    return {
+        "timeout": httpx.Timeout(
+            read_timeout or config.OLLAMA_READ_TIMEOUT,
+            connect=config.OLLAMA_CONNECT_TIMEOUT,
+            pool=config.OLLAMA_CONNECT_TIMEOUT,
+        ),
+        "limits": httpx.Limits(
+            max_connections=config.OLLAMA_POOL_SIZE,
+            max_keepalive_connections=config.OLLAMA_POOL_SIZE,
+            keepalive_expiry=config.OLLAMA_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of overall traffic.
+
+    Every request deposits ``ratio`` tokens and every retry withdraws one,
+    so retries can never multiply load on an already failing backend.
+    ``reserve`` tokens are available up front to allow retries at low traffic.
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: int = 3):
+        """
+        Initialize the budget.
+
+        Args:
+            ratio: Retries allowed per request in steady state
+            reserve: Maximum number of banked retries
+        """
+        self.ratio = ratio
+        self.reserve = float(reserve)
+        self._tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Credit the budget for one request"""
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """
+        Take one retry from the budget.
+
+        Returns:
+            True if a retry is allowed
+        """
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
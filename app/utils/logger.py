@@ -1,51 +1,227 @@
 """
 Logging Configuration
+
+By default records are handed to a background thread through a queue
+(QueueHandler + QueueListener), so formatting and console and file I/O
+never happen on the request path.
 """
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import threading
 from pathlib import Path
 
+from app.core.config import Config
+
+# Request id of the request being handled, attached to every record
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+_TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Queue mode state: one queue and listener thread for the whole process
+_state_lock = threading.Lock()
+_log_queue = None
+_listener = None
+_queue_handlers = []
+_file_handlers = {}
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id to each record"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of high-volume INFO records.
+
+    Only records logged with ``extra={"sampled": True}`` are sampled;
+    everything else, and anything at WARNING or above, is always kept.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sampled', False) and record.levelno <= logging.INFO:
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, _DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', '-'),
+            "message": record.getMessage(),
+        }
+        timings = getattr(record, 'timings', None)
+        if timings:
+            entry["timings"] = timings
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _RoutingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that tags records with the handlers they are meant for"""
+
+    def __init__(self, log_queue, targets):
+        super().__init__(log_queue)
+        self.targets = targets
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare, do not format here: the message and
+        # traceback are rendered by the target handlers on the listener thread
+        record = copy.copy(record)
+        record.log_targets = self.targets
+        return record
+
+
+class _DispatchHandler(logging.Handler):
+    """Listener-side handler passing each record to its target handlers"""
+
+    def handle(self, record):
+        for handler in getattr(record, 'log_targets', ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+def _create_formatter():
+    """Create the formatter selected by LOG_FORMAT"""
+    if Config.LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter(_TEXT_FORMAT, datefmt=_DATE_FORMAT)
+
+
+def _get_file_handler(log_file):
+    """
+    Get the rotating handler for a log file (shared by all loggers using it).
+
+    Rotates by time when LOG_ROTATE_WHEN is set (e.g. 'midnight'),
+    otherwise by size (LOG_MAX_BYTES).
+    """
+    if log_file not in _file_handlers:
+        # Create logs directory if it doesn't exist
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+
+        if Config.LOG_ROTATE_WHEN:
+            handler = logging.handlers.TimedRotatingFileHandler(
+                log_file, when=Config.LOG_ROTATE_WHEN,
+                backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8'
+            )
+        else:
+            handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=Config.LOG_MAX_BYTES,
+                backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8'
+            )
+        handler.setFormatter(_create_formatter())
+        handler.addFilter(RequestContextFilter())
+        _file_handlers[log_file] = handler
+    return _file_handlers[log_file]
+
+
+def _start_listener():
+    """Create the queue and start the background listener thread"""
+    global _log_queue, _listener
+    _log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_log_queue, _DispatchHandler())
+    _listener.start()
+    for handler in _queue_handlers:
+        handler.queue = _log_queue
+
+
+def _get_queue_handler(targets):
+    """Get a QueueHandler feeding the shared listener, starting it if needed"""
+    if _listener is None:
+        _start_listener()
+        atexit.register(stop_logging)
+    handler = _RoutingQueueHandler(_log_queue, targets)
+    _queue_handlers.append(handler)
+    return handler
+
+
+def _restart_after_fork():
+    """Threads do not survive fork; give the child process its own listener"""
+    global _listener
+    if _listener is not None:
+        _listener = None
+        _start_listener()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def stop_logging():
+    """Flush queued records and stop the background listener"""
+    global _listener
+    with _state_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
 
 def setup_logger(name, log_file=None, level=logging.INFO):
     """
     Setup logger with console and file handlers.
-    
+
+    With LOG_QUEUE_ENABLED the handlers run on a background listener thread
+    and the logger itself only enqueues records.
+
     Args:
         name: Logger name (usually __name__)
-        log_file: Path to log file (optional)
+        log_file: Path to log file (optional, rotated per LOG_MAX_BYTES/LOG_ROTATE_WHEN)
         level: Logging level
-    
+
     Returns:
         Configured logger instance
     """
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
+
     # Avoid duplicate handlers
     if logger.handlers:
         return logger
-    
+
+    logger.addFilter(RequestContextFilter())
+    if Config.LOG_SAMPLE_RATE < 1.0:
+        logger.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATE))
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(level)
-    
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+    console_handler.setFormatter(_create_formatter())
+    console_handler.addFilter(RequestContextFilter())
+    handlers = [console_handler]
+
     # File handler (if log_file specified)
     if log_file:
-        # Create logs directory if it doesn't exist
-        log_dir = Path(log_file).parent
-        log_dir.mkdir(exist_ok=True)
-        
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(level)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    
+        handlers.append(_get_file_handler(log_file))
+
+    if not Config.LOG_QUEUE_ENABLED:
+        for handler in handlers:
+            logger.addHandler(handler)
+        return logger
+
+    with _state_lock:
+        logger.addHandler(_get_queue_handler(handlers))
+
     return logger
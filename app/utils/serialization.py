@@ -0,0 +1,100 @@
+"""
+Response Serialization
+
+JSON provider backed by orjson (falling back to the standard library when
+orjson is not installed or cannot encode a value) and gzip compression of
+large JSON responses.
+"""
+import dataclasses
+import gzip
+import math
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _has_non_finite(obj) -> bool:
+    """Whether obj contains a NaN or infinite float"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return _has_non_finite(dataclasses.asdict(obj))
+    return False
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        """
+        Serialize to a JSON string.
+
+        Flask passes ``separators`` (compact) or ``indent=2`` (debug); both
+        map to orjson options. Any other argument uses the stdlib encoder.
+        Dates and dataclasses go through Flask's ``default`` (HTTP dates,
+        not orjson's ISO format), and since orjson writes NaN and infinity
+        as null, output containing null is re-encoded by the stdlib when
+        the value holds such a float.
+        """
+        options = {key: value for key, value in kwargs.items() if key != 'separators'}
+        indent = options.pop('indent', None)
+        if orjson is not None and not options and indent in (None, 2):
+            option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                      | orjson.OPT_PASSTHROUGH_DATACLASS)
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                data = orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                pass  # e.g. integers beyond 64 bits
+            else:
+                if b'null' not in data or not _has_non_finite(obj):
+                    return data.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes"""
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+
+def gzip_response(response: Response, accepts_gzip: bool,
+                  min_bytes: int = 1024, level: int = 5) -> Response:
+    """
+    Compress a JSON response if the client accepts gzip and it is large.
+
+    Args:
+        response: Outgoing response
+        accepts_gzip: Whether the client's Accept-Encoding allows gzip
+        min_bytes: Smaller bodies are sent uncompressed
+        level: gzip compression level (1 fastest - 9 smallest)
+
+    Returns:
+        The response, compressed in place when worthwhile
+    """
+    if (not accepts_gzip
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=level))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
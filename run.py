@@ -19,7 +19,7 @@ if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = config_name == 'development'
     
-    logger.info(f"Starting application in {config_name} mode")
-    logger.info(f"Server running on http://{host}:{port}")
+    logger.info("Starting application in %s mode", config_name)
+    logger.info("Server running on http://%s:%s", host, port)
     
     app.run(host=host, port=port, debug=debug)
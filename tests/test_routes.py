@@ -66,3 +66,246 @@ def test_rebuild_index_endpoint(client):
     assert response.status_code in [200, 500]
     data = json.loads(response.data)
     assert 'message' in data or 'error' in data
+
+
+def test_metrics_endpoint(client):
+    """Test the metrics endpoint"""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    
+    data = json.loads(response.data)
+    assert 'counters' in data
+    assert 'summaries' in data
+
+
+def test_chat_rate_limited(app, client):
+    """Test that clients over their rate limit get 429 with Retry-After"""
+    from app.services.admission import AdmissionController
+    
+    app.extensions['admission'] = AdmissionController(
+        requests_per_minute=1, burst=1, max_in_flight=4, max_in_flight_batch=1
+    )
+    payload = json.dumps({'query': ''})
+    first = client.post('/chat', data=payload, content_type='application/json')
+    second = client.post('/chat', data=payload, content_type='application/json')
+    
+    assert first.status_code == 400
+    assert second.status_code == 429
+    assert int(second.headers['Retry-After']) >= 1
+
+
+def test_chat_sheds_load_when_at_capacity(app, client):
+    """Test that requests beyond the in-flight cap get 503"""
+    from app.services.admission import AdmissionController, LANE_INTERACTIVE
+    
+    admission = AdmissionController(
+        requests_per_minute=60, burst=10, max_in_flight=1, max_in_flight_batch=1
+    )
+    app.extensions['admission'] = admission
+    assert admission.try_enter(LANE_INTERACTIVE)
+    
+    response = client.post('/chat', data=json.dumps({'query': ''}),
+                           content_type='application/json')
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    
+    admission.leave(LANE_INTERACTIVE)
+    response = client.post('/chat', data=json.dumps({'query': ''}),
+                           content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_request_id_header(client):
+    """Test that request ids are echoed back"""
+    response = client.get('/', headers={'X-Request-ID': 'req-42'})
+    assert response.headers['X-Request-ID'] == 'req-42'
+    
+    response = client.get('/')
+    assert response.headers['X-Request-ID']
+
+
+def test_chat_unknown_collection(client):
+    """Test that an unconfigured collection returns 404"""
+    response = client.post(
+        '/chat?collection=does-not-exist',
+        data=json.dumps({'query': 'What is mastitis?'}),
+        content_type='application/json'
+    )
+    assert response.status_code == 404
+    assert 'error' in json.loads(response.data)
+
+
+def test_rebuild_index_disabled(app, client):
+    """Test that index building can be kept off the request path"""
+    app.config['INDEX_BUILD_ON_DEMAND'] = False
+    response = client.post('/rebuild_index')
+    assert response.status_code == 403
+    assert 'app.build_index' in json.loads(response.data)['error']
+
+
+def test_chat_invalid_session_id(client):
+    """Test that a non-string session id is rejected"""
+    response = client.post('/chat', data=json.dumps({'query': 'What is mastitis?', 'session_id': 42}),
+                           content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_chat_requests_are_journaled(app, client, tmp_path):
+    """Test that /chat requests, including invalid ones, reach the journal"""
+    from app.services.journal import RequestJournal
+    
+    path = tmp_path / "journal.jsonl"
+    app.extensions['journal'] = RequestJournal(str(path), flush_interval=0.01)
+    client.post('/chat', data=json.dumps({'query': '', 'session_id': 'abc'}),
+                content_type='application/json')
+    client.get('/')
+    app.extensions.pop('journal').close()
+    
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(entries) == 1
+    assert entries[0]['status'] == 400
+    assert entries[0]['session_id'] == 'abc'
+    assert entries[0]['outcome'] == 'error'
+
+
+def test_search_and_batch_endpoints(client, monkeypatch):
+    """Test search and batch chat responses, validation limits and gzip"""
+    import gzip
+    from langchain_core.documents import Document
+    from app.core.exceptions import ChatServiceError
+    from app.routes import chat as chat_routes
+    
+    class FakeService:
+        def search(self, query, k=None):
+            return [(Document(page_content="Mastitis " * 200, metadata={'source': 'a.docx'}), 0.9)]
+        
+        def chat(self, query, history=None, trace=None):
+            if query == 'fail':
+                raise ChatServiceError("no backend")
+            return f"answer to {query}"
+    
+    monkeypatch.setattr(chat_routes, 'get_chat_service', lambda collection=None, load=True: FakeService())
+    
+    response = client.post('/search', data=json.dumps({'query': 'mastitis', 'k': 1}),
+                           headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    result = json.loads(gzip.decompress(response.data))['results'][0]
+    assert result['source'] == 'a.docx' and result['score'] == 0.9
+    
+    response = client.post('/search', data=json.dumps({'query': 'mastitis', 'k': 1000}))
+    assert response.status_code == 400
+    assert 'at most' in json.loads(response.data)['error']
+    
+    response = client.post('/chat/batch', data=json.dumps({'queries': ['udder', 'fail']}))
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.data)['results'] == [{'answer': 'answer to udder'},
+                                                    {'error': 'no backend'}]
+    
+    response = client.post('/chat/batch', data=json.dumps({'queries': ['q'] * 100}))
+    assert response.status_code == 400
+    response = client.post('/chat', data=b'not json', content_type='application/json')
+    assert response.status_code == 400
+    response = client.post('/chat', data=json.dumps({}))
+    assert json.loads(response.data)['error'] == "Field 'query' is required"
+
+
+def test_batch_is_charged_per_query_and_journaled(app, client, monkeypatch, tmp_path):
+    """Test that each batch query costs one rate-limit token and batches reach the journal"""
+    from langchain_core.documents import Document
+    from app.routes import chat as chat_routes
+    from app.services.admission import AdmissionController
+    from app.services.journal import RequestJournal
+    
+    class FakeService:
+        def search(self, query, k=None):
+            return [(Document(page_content="Mastitis"), 0.9)]
+        
+        def chat(self, query, history=None, trace=None):
+            return f"answer to {query}"
+    
+    monkeypatch.setattr(chat_routes, 'get_chat_service', lambda collection=None, load=True: FakeService())
+    app.extensions['admission'] = AdmissionController(
+        requests_per_minute=0.001, burst=3, max_in_flight=10, max_in_flight_batch=10
+    )
+    path = tmp_path / "journal.jsonl"
+    app.extensions['journal'] = RequestJournal(str(path), flush_interval=0.01)
+    
+    response = client.post('/chat/batch', data=json.dumps({'queries': ['a', 'b', 'c', 'd']}))
+    assert response.status_code == 400
+    assert 'max 3' in json.loads(response.data)['error']
+    response = client.post('/search', data=json.dumps({'query': 'mastitis'}))
+    assert response.status_code == 200
+    response = client.post('/chat/batch', data=json.dumps({'queries': ['a', 'b']}))
+    assert response.status_code == 429
+    app.extensions.pop('journal').close()
+    
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(e['path'], e['status'], e['outcome']) for e in entries] == [
+        ('/chat/batch', 400, 'error'), ('/search', 200, 'ok'), ('/chat/batch', 429, 'rejected')
+    ]
+    assert entries[1]['query'] == 'mastitis'
+    assert entries[2]['queries'] == ['a', 'b']
+
+
+def test_trusted_proxy_hops_key_clients_on_forwarded_address(monkeypatch):
+    """Test that clients behind a trusted proxy get their own rate limit buckets"""
+    from app import create_app
+    from app.core.config import get_config
+    from app.services.admission import AdmissionController
+    
+    monkeypatch.setattr(get_config('testing'), 'TRUSTED_PROXY_HOPS', 1)
+    app = create_app('testing')
+    app.extensions['admission'] = AdmissionController(
+        requests_per_minute=0.001, burst=1, max_in_flight=10, max_in_flight_batch=10
+    )
+    client = app.test_client()
+    
+    def post(forwarded_for):
+        return client.post('/chat', data=json.dumps({}),
+                           headers={'X-Forwarded-For': forwarded_for}).status_code
+    
+    assert post('203.0.113.1') == 400
+    assert post('203.0.113.2') == 400
+    assert post('203.0.113.1') == 429
+
+
+def test_vector_store_errors_are_reported(client, monkeypatch):
+    """Test that a broken collection index is reported instead of a generic error"""
+    from app.core.exceptions import VectorStoreError
+    from app.routes import chat as chat_routes
+    
+    def broken_collection(collection=None, load=True):
+        raise VectorStoreError("Index for collection 'default' is corrupt")
+    
+    monkeypatch.setattr(chat_routes, 'get_chat_service', broken_collection)
+    for path, body in [('/chat', {'query': 'What is mastitis?'}),
+                       ('/chat/batch', {'queries': ['What is mastitis?']}),
+                       ('/search', {'query': 'mastitis'})]:
+        response = client.post(path, data=json.dumps(body))
+        assert response.status_code == 500
+        assert 'corrupt' in json.loads(response.data)['error']
+
+
+def test_sessions_are_scoped_to_the_caller(client, monkeypatch):
+    """Test that a session id used by another client does not expose its history"""
+    from app.routes import chat as chat_routes
+    
+    histories = []
+    
+    class FakeService:
+        def chat(self, query, history=None, trace=None):
+            histories.append(list(history or []))
+            return f"answer to {query}"
+    
+    monkeypatch.setattr(chat_routes, 'get_chat_service', lambda collection=None, load=True: FakeService())
+    body = json.dumps({'query': 'What is mastitis?', 'session_id': 'shared'})
+    
+    client.post('/chat', data=body, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    client.post('/chat', data=body, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    client.post('/chat', data=body, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    
+    assert histories[0] == []
+    assert histories[1] == [('What is mastitis?', 'answer to What is mastitis?')]
+    assert histories[2] == []
@@ -1,6 +1,7 @@
 """
 Service Layer Tests
 """
+import os
 import pytest
 from app.utils.helpers import validate_query, format_documents
 from langchain_core.documents import Document
@@ -54,3 +55,931 @@ def test_format_documents_empty():
     """Test document formatting with empty list"""
     result = format_documents([])
     assert result == ""
+
+
+def test_prefix_cache_prompt_keeps_static_prefix():
+    """Test that the prefix_cache layout keeps instructions request-invariant"""
+    from app.services.chat_service import ChatService
+    
+    service = ChatService('testing')
+    service.config.PROMPT_LAYOUT = 'prefix_cache'
+    prompt = service._create_prompt()
+    
+    first = prompt.format_messages(context="Mastitis facts", input="What is mastitis?")
+    second = prompt.format_messages(context="Feeding facts", input="How to feed calves?")
+    assert first[0].content == second[0].content
+    assert "{context}" not in first[0].content
+    assert "Mastitis facts" in first[1].content
+
+
+def test_legacy_prompt_embeds_context_in_system():
+    """Test that the legacy layout puts context in the system message"""
+    from app.services.chat_service import ChatService
+    
+    service = ChatService('testing')
+    service.config.PROMPT_LAYOUT = 'legacy'
+    messages = service._create_prompt().format_messages(context="Mastitis facts", input="q")
+    assert len(messages) == 2
+    assert "Mastitis facts" in messages[0].content
+
+
+def test_prompt_layouts_share_instructions(monkeypatch):
+    """Test that both layouts use the same rules and unknown layouts are rejected"""
+    from app.core.config import get_config
+    from app.core.constants import SYSTEM_INSTRUCTIONS, SYSTEM_PROMPT
+    from app.services.chat_service import ChatService
+    
+    rules = SYSTEM_INSTRUCTIONS[SYSTEM_INSTRUCTIONS.index("RULES:"):]
+    assert rules in SYSTEM_PROMPT
+    
+    monkeypatch.setattr(get_config('testing'), 'PROMPT_LAYOUT', 'prefix-cache')
+    with pytest.raises(ValueError):
+        ChatService('testing')
+
+
+def test_metrics_summary():
+    """Test metrics counters and summaries"""
+    from app.utils.metrics import Metrics
+    
+    registry = Metrics()
+    registry.increment("requests")
+    registry.increment("requests", 2)
+    registry.observe("latency_ms", 10)
+    registry.observe("latency_ms", 30)
+    
+    snapshot = registry.snapshot()
+    assert snapshot["counters"]["requests"] == 3
+    assert snapshot["summaries"]["latency_ms"]["avg"] == 20
+    assert snapshot["summaries"]["latency_ms"]["max"] == 30
+
+
+def test_backend_pool_routes_to_least_loaded():
+    """Test least-outstanding-requests routing"""
+    from app.services.backend_pool import BackendPool
+    
+    pool = BackendPool(["http://a", "http://b"], max_concurrency=2)
+    with pool.acquire() as first:
+        with pool.acquire() as second:
+            assert first.url != second.url
+
+
+def test_backend_pool_ejects_failing_backend():
+    """Test that a backend is ejected after repeated failures"""
+    from app.services.backend_pool import BackendPool
+    
+    pool = BackendPool(["http://a", "http://b"], failure_threshold=2, eject_seconds=60)
+    failing = pool.backends[0]
+    for _ in range(2):
+        pool._record_failure(failing)
+    
+    assert not failing.healthy
+    for _ in range(3):
+        with pool.acquire() as backend:
+            assert backend.url == "http://b"
+
+
+def test_backend_pool_retries_connection_error_on_other_backend():
+    """Test that connection failures are retried elsewhere within the budget"""
+    from app.services.backend_pool import BackendPool
+    from app.utils.http_client import RetryBudget
+    
+    pool = BackendPool(["http://a", "http://b"], retry_budget=RetryBudget(reserve=1))
+    calls = []
+    
+    def fn(url):
+        calls.append(url)
+        if len(calls) == 1:
+            raise ConnectionError("refused")
+        return url
+    
+    result = pool.call(("test",), lambda url: url, fn)
+    assert calls == [calls[0], result]
+    assert result != calls[0]
+    
+    # Budget is exhausted, so the next connection failure is raised
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        pool.call(("test",), lambda url: url, fn)
+
+
+def test_retry_budget_limits_retries():
+    """Test that the retry budget refills only with traffic"""
+    from app.utils.http_client import RetryBudget
+    
+    budget = RetryBudget(ratio=0.5, reserve=1)
+    assert budget.try_withdraw() is True
+    assert budget.try_withdraw() is False
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_withdraw() is True
+
+
+def test_admission_batch_lane_is_capped():
+    """Test that batch traffic cannot take every in-flight slot"""
+    from app.services.admission import AdmissionController, LANE_BATCH, LANE_INTERACTIVE
+    
+    admission = AdmissionController(
+        requests_per_minute=60, burst=10, max_in_flight=2, max_in_flight_batch=1
+    )
+    assert admission.try_enter(LANE_BATCH)
+    assert not admission.try_enter(LANE_BATCH)
+    assert admission.try_enter(LANE_INTERACTIVE)
+    assert not admission.try_enter(LANE_INTERACTIVE)
+
+
+def test_chat_skips_llm_for_low_retrieval_score(monkeypatch):
+    """Test that weak retrieval returns the canned answer without generation"""
+    from app.core.constants import MSG_NO_INFORMATION
+    from app.services.chat_service import ChatService
+    from app.utils.metrics import metrics
+    
+    service = ChatService('testing')
+    service.config.RETRIEVAL_MIN_SCORE = 0.5
+    monkeypatch.setattr(service, "_retrieve",
+                        lambda query: [(Document(page_content="Python lists"), 0.1)])
+    monkeypatch.setattr(service, "_generate",
+                        lambda prompt, route=None: pytest.fail("LLM should not be called"))
+    
+    before = metrics.snapshot()["counters"].get("chat.generations_avoided", 0)
+    assert service.chat("How do I sort a list in Python?") == MSG_NO_INFORMATION
+    assert metrics.snapshot()["counters"]["chat.generations_avoided"] == before + 1
+
+
+def test_chat_generates_from_retrieved_context(monkeypatch):
+    """Test that relevant retrieval results are passed to the LLM"""
+    from langchain_core.messages import AIMessage
+    from app.services.chat_service import ChatService
+    
+    service = ChatService('testing')
+    service.config.RETRIEVAL_MIN_SCORE = 0.5
+    monkeypatch.setattr(service, "_retrieve",
+                        lambda query: [(Document(page_content="Mastitis is udder inflammation"), 0.9)])
+    prompts = []
+    
+    def fake_generate(prompt_value, route=None):
+        prompts.append(prompt_value.to_string())
+        return AIMessage(content="• Mastitis is udder inflammation")
+    
+    monkeypatch.setattr(service, "_generate", fake_generate)
+    
+    assert service.chat("What is mastitis?") == "• Mastitis is udder inflammation"
+    assert "Mastitis is udder inflammation" in prompts[0]
+
+
+def test_domain_classifier():
+    """Test the corpus keyword domain classifier"""
+    from app.services.domain_classifier import DomainClassifier
+    
+    classifier = DomainClassifier(
+        ["Mastitis is an inflammation of the udder in dairy cattle",
+         "Calves should receive colostrum within hours of birth"],
+        min_overlap=0.3
+    )
+    assert classifier.is_in_domain("How to treat mastitis in cattle?")
+    assert not classifier.is_in_domain("Write a python function to reverse a string")
+
+
+def test_json_formatter_includes_request_context():
+    """Test structured log records carry request id and timings"""
+    import json
+    import logging
+    from app.utils.logger import JsonFormatter, RequestContextFilter, request_id_var
+    
+    record = logging.LogRecord("app", logging.INFO, __file__, 1,
+                               "Processed %s", ("query",), None)
+    record.timings = {"retrieve_ms": 3.2}
+    token = request_id_var.set("abc123")
+    try:
+        RequestContextFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Processed query"
+    assert entry["request_id"] == "abc123"
+    assert entry["timings"] == {"retrieve_ms": 3.2}
+
+
+def test_queued_records_are_formatted_on_the_listener():
+    """Test that queued records keep their arguments and traceback for the JSON formatter"""
+    import io
+    import json
+    import logging
+    import queue
+    from app.utils.logger import JsonFormatter, _DispatchHandler, _RoutingQueueHandler
+    
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("test_queued_records")
+    logger.propagate = False
+    logger.addHandler(_RoutingQueueHandler(log_queue, [target]))
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("Failed on %s", "query")
+    
+    record = log_queue.get_nowait()
+    assert (record.msg, record.args) == ("Failed on %s", ("query",))
+    assert record.exc_info is not None
+    _DispatchHandler().handle(record)
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "Failed on query"
+    assert "ZeroDivisionError" in entry["exception"]
+
+
+def test_sampling_filter_only_drops_sampled_info():
+    """Test that sampling never drops warnings or unmarked records"""
+    import logging
+    from app.utils.logger import SamplingFilter
+    
+    sampler = SamplingFilter(0.0)
+    sampled = logging.LogRecord("app", logging.INFO, __file__, 1, "x", None, None)
+    sampled.sampled = True
+    plain = logging.LogRecord("app", logging.INFO, __file__, 1, "x", None, None)
+    warning = logging.LogRecord("app", logging.WARNING, __file__, 1, "x", None, None)
+    warning.sampled = True
+    
+    assert sampler.filter(sampled) is False
+    assert sampler.filter(plain) is True
+    assert sampler.filter(warning) is True
+
+
+def test_in_flight_tracker_counts_until_response_closed():
+    """Test that the pre-fork worker tracks requests until fully sent"""
+    from app.server import InFlightTracker
+    
+    def wsgi_app(environ, start_response):
+        start_response("200 OK", [])
+        return [b"ok"]
+    
+    tracker = InFlightTracker(wsgi_app)
+    response = tracker({}, lambda status, headers: None)
+    assert tracker.count == 1
+    assert tracker.wait_idle(timeout=0.01) is False
+    
+    response.close()
+    assert tracker.count == 0
+    assert tracker.wait_idle(timeout=0.01) is True
+
+
+def test_collection_config_overrides(tmp_path, monkeypatch):
+    """Test per-collection directories and chunk settings"""
+    import json
+    from app.core.config import Config, get_collection_config
+    
+    collections_file = tmp_path / "collections.json"
+    collections_file.write_text(json.dumps({"poultry": {"chunk_size": 500}}))
+    monkeypatch.setattr(Config, "COLLECTIONS_FILE", str(collections_file))
+    
+    config = get_collection_config('testing', 'poultry')
+    assert config.CHUNK_SIZE == 500
+    assert config.DATA_DIR.endswith(os.path.join('data', 'poultry'))
+    assert config.VECTOR_DIR.endswith('faiss_index_poultry')
+    
+    default = get_collection_config('testing')
+    assert default.VECTOR_DIR == Config.VECTOR_DIR
+
+
+def test_collection_registry_evicts_least_recently_used(tmp_path, monkeypatch):
+    """Test that collections beyond the memory budget are evicted LRU-first"""
+    import json
+    from app.core.config import Config
+    from app.services.collection_registry import CollectionRegistry
+    from app.services.vector_service import VectorStoreService
+    
+    collections_file = tmp_path / "collections.json"
+    collections_file.write_text(json.dumps({"dairy": {}, "poultry": {}, "fisheries": {}}))
+    monkeypatch.setattr(Config, "COLLECTIONS_FILE", str(collections_file))
+    monkeypatch.setattr(Config, "COLLECTION_MEMORY_BUDGET_MB", 2)
+    monkeypatch.setattr(VectorStoreService, "get_vectorstore", lambda self: None)
+    monkeypatch.setattr(VectorStoreService, "memory_footprint", lambda self: 1024 * 1024)
+    
+    registry = CollectionRegistry('testing')
+    registry.get("dairy")
+    registry.get("poultry")
+    registry.get("dairy")
+    registry.get("fisheries")
+    
+    assert registry.loaded() == ["dairy", "fisheries"]
+
+
+SAMPLE_QA_TEXT = """Questions for Chatbot:
+
+Management and reproduction
+
+Q1. What is service period?
+
+Ans. It is the period between date of calving and date of successful conception.
+
+Q2. What is the optimum service period for cattle?
+
+Ans. For cattle the optimum service period is 60-90 days.
+
+Nutrition & Feeding
+
+Q3. Which mineral is a component of vitamin B12?
+
+Ans. Cobalt
+
+Q4. What is service period?
+
+Ans. It is the period between date of calving and date of successful conception.
+"""
+
+
+def test_split_units_follows_headings_and_questions():
+    """Test question/answer units keep their section heading"""
+    from app.utils.chunking import split_units
+    
+    units = split_units(SAMPLE_QA_TEXT)
+    assert [heading for heading, _ in units] == [
+        '', 'Management and reproduction', 'Management and reproduction',
+        'Nutrition & Feeding', 'Nutrition & Feeding'
+    ]
+    assert units[3][1] == "Q3. Which mineral is a component of vitamin B12?\nAns. Cobalt"
+
+
+def test_structure_splitter_removes_duplicate_units():
+    """Test that repeated answers are dropped and chunks never split a unit"""
+    from app.utils.chunking import StructureAwareSplitter
+    
+    splitter = StructureAwareSplitter(chunk_size=300, chunk_overlap=50, dedup_max_distance=3)
+    chunks = splitter.split_documents([Document(page_content=SAMPLE_QA_TEXT)])
+    
+    assert len(splitter.removed_units) == 1
+    text = "\n\n".join(chunk.page_content for chunk in chunks)
+    assert text.count("date of successful conception") == 1
+    assert all(chunk.page_content.count("Q") == chunk.page_content.count("Ans.")
+               for chunk in chunks if chunk.metadata["section"])
+
+
+def test_simhash_near_duplicates():
+    """Test SimHash distance for near-identical and unrelated text"""
+    from app.utils.dedup import hamming_distance, simhash
+    
+    base = "Milking should be done twice a day, however thrice a day milking gives higher milk yield"
+    near = "Milking should be done twice a day; however thrice a day milking gives higher milk yield."
+    other = "Green fodder should be chopped before feeding to reduce wastage in dairy animals"
+    
+    assert hamming_distance(simhash(base), simhash(near)) <= 3
+    assert hamming_distance(simhash(base), simhash(other)) > 3
+
+
+def test_dedup_keeps_units_that_differ_in_numbers():
+    """Test that dosages differing only in numbers are not deduplicated"""
+    from app.utils.dedup import hamming_distance, remove_near_duplicates, simhash
+    
+    first, second = "Give 5 ml per 10 kg", "Give 2 ml per 50 kg"
+    assert hamming_distance(simhash(first), simhash(second)) > 0
+    
+    docs = [Document(page_content=first), Document(page_content=second),
+            Document(page_content="3. Give 5 ml per 10 kg.")]
+    kept, removed = remove_near_duplicates(docs, max_distance=3)
+    assert [doc.page_content for doc in kept] == [first, second]
+    assert [doc.page_content for doc in removed] == ["3. Give 5 ml per 10 kg."]
+
+
+def test_quantized_index_build_and_reload(tmp_path, monkeypatch):
+    """Test int8 quantization reports recall and re-ranks with mmap'd vectors"""
+    import numpy as np
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.core.config import Config
+    from app.services.quantized_index import QuantizedFAISS
+    from app.services.vector_service import VectorStoreService
+    
+    monkeypatch.setattr(Config, "INDEX_QUANTIZATION", "int8")
+    monkeypatch.setattr(Config, "CHUNK_STRATEGY", "recursive")
+    monkeypatch.setattr(Config, "DEDUP_ENABLED", False)
+    service = VectorStoreService('testing')
+    service.config.VECTOR_DIR = str(tmp_path)
+    service.embeddings = DeterministicFakeEmbedding(size=64)
+    docs = [Document(page_content=f"Chunk {i}") for i in range(50)]
+    monkeypatch.setattr(service, "_load_documents", lambda: docs)
+    
+    service.build_vectorstore()
+    report = service.last_build_report
+    assert report["quantization"] == "int8"
+    assert report["index_bytes"] * 4 == report["float_index_bytes"]
+    assert report["recall_at_k_reranked"] >= 0.9
+    assert (tmp_path / "vectors.npy").exists()
+    
+    loaded = service.load_vectorstore()
+    assert isinstance(loaded, QuantizedFAISS)
+    assert isinstance(loaded.rerank_vectors, np.memmap)
+    query = docs[7].page_content
+    best_doc, best_score = loaded.similarity_search_with_score(query, k=1)[0]
+    assert best_doc.page_content == query
+    assert best_score == pytest.approx(0.0, abs=1e-5)
+
+
+def test_lexical_reranker_keeps_best_chunks_and_caches_scores():
+    """Test BM25 re-ranking promotes keyword matches and reuses cached scores"""
+    from app.services.reranker import LexicalReranker
+    from app.utils.metrics import metrics
+    
+    docs = [
+        Document(page_content="Housing should be well ventilated and dry", id="housing"),
+        Document(page_content="Mastitis is inflammation of the udder; treat mastitis early", id="mastitis"),
+        Document(page_content="Green fodder improves milk yield", id="fodder"),
+    ]
+    reranker = LexicalReranker([doc.page_content for doc in docs], weight=0.5)
+    candidates = [(docs[0], 0.8), (docs[1], 0.7), (docs[2], 0.6)]
+    
+    top = reranker.rerank("How to treat mastitis?", candidates, top_n=2)
+    assert [doc.id for doc, _ in top] == ["mastitis", "housing"]
+    
+    hits = metrics.snapshot()["counters"].get("reranker.cache_hits", 0)
+    reranker.rerank("treat mastitis how", candidates, top_n=2)
+    assert metrics.snapshot()["counters"]["reranker.cache_hits"] == hits + 3
+
+
+def test_index_watcher_reindexes_only_changed_files(tmp_path, monkeypatch):
+    """Test that the watcher swaps in an index updated for changed/removed files"""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.core.config import Config
+    from app.services.index_watcher import IndexWatcher
+    from app.services.vector_service import VectorStoreService
+    
+    monkeypatch.setattr(Config, "CHUNK_STRATEGY", "recursive")
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.docx").write_text("Housing should be dry")
+    (data_dir / "b.docx").write_text("Mastitis is udder inflammation")
+    
+    service = VectorStoreService('testing')
+    service.config.DATA_DIR = str(data_dir)
+    service.config.VECTOR_DIR = str(tmp_path / "index")
+    service.embeddings = DeterministicFakeEmbedding(size=16)
+    loaded = []
+    
+    def fake_load(filenames=None):
+        filenames = filenames if filenames is not None else list(service.list_source_files())
+        loaded.extend(filenames)
+        return [Document(page_content=(data_dir / name).read_text(),
+                         metadata={"source": str(data_dir / name)}) for name in filenames]
+    
+    monkeypatch.setattr(service, "_load_documents", fake_load)
+    service.build_vectorstore()
+    original = service.get_vectorstore()
+    
+    watcher = IndexWatcher(service, debounce_seconds=0)
+    assert not watcher.check()
+    
+    loaded.clear()
+    (data_dir / "a.docx").unlink()
+    (data_dir / "c.docx").write_text("Green fodder improves milk yield")
+    assert watcher.check()
+    
+    assert loaded == ["c.docx"]
+    assert service.get_vectorstore() is not original
+    texts = sorted(service.get_chunk_texts())
+    assert texts == ["Green fodder improves milk yield", "Mastitis is udder inflammation"]
+    assert sorted(service.indexed_sources) == ["b.docx", "c.docx"]
+    assert watcher.status()["pending_changes"] == []
+    assert watcher.status()["last_indexed_at"] is not None
+    assert (tmp_path / "index" / "sources.json").exists()
+    
+    # A copy of an indexed chunk is not added again
+    (data_dir / "d.docx").write_text("Mastitis is udder inflammation.")
+    assert watcher.check()
+    assert sorted(service.get_chunk_texts()) == texts
+    
+    # Each save is a new version behind an atomically replaced symlink
+    assert (tmp_path / "index").is_symlink()
+    versions = sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("index.v"))
+    assert len(versions) == 2 and os.readlink(tmp_path / "index") == versions[-1]
+
+
+def test_index_watcher_wakes_on_file_events(tmp_path, monkeypatch):
+    """Test that watchdog events trigger a check without waiting for a poll"""
+    import threading
+    from types import SimpleNamespace
+    from app.services.index_watcher import MODE_EVENTS, IndexWatcher
+    pytest.importorskip('watchdog')
+    
+    service = SimpleNamespace(config=SimpleNamespace(DATA_DIR=str(tmp_path),
+                                                     VECTOR_DIR=str(tmp_path / "index")))
+    watcher = IndexWatcher(service, poll_interval=60)
+    checks = []
+    checked = threading.Event()
+    
+    def fake_check():
+        checks.append(sorted(os.listdir(tmp_path)))
+        checked.set()
+    
+    monkeypatch.setattr(watcher, "check", fake_check)
+    watcher.start()
+    try:
+        assert watcher.mode == MODE_EVENTS
+        assert checked.wait(5)  # startup check
+        checked.clear()
+        (tmp_path / "a.docx").write_text("Housing should be dry")
+        assert checked.wait(5)
+        assert checks[-1] == ["a.docx"]
+    finally:
+        watcher.stop()
+
+
+def test_build_resumes_from_checkpoint(tmp_path, monkeypatch):
+    """Test that an interrupted build keeps finished batches and resumes"""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.core.config import Config
+    from app.core.exceptions import VectorStoreError
+    from app.services.vector_service import VectorStoreService
+    
+    monkeypatch.setattr(Config, "CHUNK_STRATEGY", "recursive")
+    monkeypatch.setattr(Config, "DEDUP_ENABLED", False)
+    
+    class FlakyEmbeddings(DeterministicFakeEmbedding):
+        fail_after: int = 2
+        calls: int = 0
+        
+        def embed_documents(self, texts):
+            self.calls += 1
+            if self.calls > self.fail_after:
+                raise ConnectionError("embedding backend went away")
+            return super().embed_documents(texts)
+    
+    service = VectorStoreService('testing')
+    service.config.VECTOR_DIR = str(tmp_path / "index")
+    service.embeddings = FlakyEmbeddings(size=16)
+    docs = [Document(page_content=f"Chunk {i}") for i in range(10)]
+    monkeypatch.setattr(service, "_load_documents", lambda: docs)
+    
+    with pytest.raises(VectorStoreError):
+        service.build_vectorstore(batch_size=3)
+    assert len(list((tmp_path / "index.checkpoint").glob("shard-*.npz"))) == 2
+    assert not (tmp_path / "index").exists()
+    
+    service.embeddings = FlakyEmbeddings(size=16, fail_after=10)
+    service.build_vectorstore(batch_size=3)
+    assert service.last_build_report["chunks_resumed"] == 6
+    assert service.embeddings.calls == 2
+    assert set(service.last_build_report["timings_ms"]) >= {"load_ms", "split_ms", "embed_ms"}
+    assert not (tmp_path / "index.checkpoint").exists()
+    assert len(service.get_chunk_texts()) == 10
+    
+    # A checkpoint from another embedding model is never mixed in
+    service.embeddings = FlakyEmbeddings(size=16, fail_after=2)
+    with pytest.raises(VectorStoreError):
+        service.build_vectorstore(batch_size=3)
+    monkeypatch.setattr(service.config, "EMBED_MODEL", "other-embed-model")
+    service.embeddings = FlakyEmbeddings(size=8, fail_after=10)
+    service.build_vectorstore(batch_size=3)
+    assert service.last_build_report["chunks_resumed"] == 0
+    assert service.get_vectorstore().index.d == 8
+
+
+def test_session_store_budget_and_eviction():
+    """Test history budget, answer truncation and LRU eviction"""
+    from app.services.session_store import SessionStore
+    
+    store = SessionStore(max_sessions=2, max_turns=3, history_tokens=20, answer_chars=30)
+    for i in range(4):
+        store.append("farmer", f"Question {i}?", "word " * 20)
+    history = store.history("farmer")
+    assert [question for question, _ in history] == ["Question 3?"]
+    assert history[0][1].endswith("...") and len(history[0][1]) <= 34
+    
+    store.append("second", "Hi?", "Hello")
+    store.history("farmer")
+    store.append("third", "Hi?", "Hello")
+    assert len(store) == 2
+    assert store.history("second") == []
+    assert store.history("farmer")
+    
+    with pytest.raises(ValueError):
+        SessionStore(max_turns=0)
+
+
+def test_load_session_store_uses_configured_backend():
+    """Test that SESSION_STORE selects a shared backend implementation"""
+    from app.services.session_store import SessionBackend, SessionStore, load_session_store
+    
+    with pytest.raises(TypeError):
+        SessionBackend()
+    config = {'SESSION_STORE': '', 'SESSION_TTL_SECONDS': 60, 'SESSION_MAX_SESSIONS': 10,
+              'SESSION_MEMORY_MB': 1, 'SESSION_MAX_TURNS': 2, 'SESSION_HISTORY_TOKENS': 100,
+              'SESSION_ANSWER_CHARS': 100}
+    assert isinstance(load_session_store(config), SessionStore)
+    config['SESSION_STORE'] = 'app.services.session_store:SessionStore'
+    assert isinstance(load_session_store(config), SessionStore)
+
+
+def test_rewrite_followup_adds_previous_terms():
+    """Test that follow-up questions borrow terms from the previous question"""
+    from app.services.session_store import rewrite_followup
+    
+    history = [("What is the ivermectin dose for cows?", "...")]
+    assert rewrite_followup("and what dose for a calf?", history) == \
+        "and what dose for a calf? ivermectin cows"
+    standalone = "What are the symptoms of milk fever in buffaloes after calving?"
+    assert rewrite_followup(standalone, history) == standalone
+    assert rewrite_followup("and for a calf?", []) == "and for a calf?"
+
+
+def test_chat_includes_session_history(monkeypatch):
+    """Test that history is used for retrieval and included in the prompt"""
+    from langchain_core.messages import AIMessage
+    from app.services.chat_service import ChatService
+    
+    service = ChatService('testing')
+    queries = []
+    
+    def fake_retrieve(query):
+        queries.append(query)
+        return [(Document(page_content="Ivermectin dose is 0.2 mg/kg"), 0.9)]
+    
+    prompts = []
+    monkeypatch.setattr(service, "_retrieve", fake_retrieve)
+    monkeypatch.setattr(service, "_generate",
+                        lambda prompt, route=None: prompts.append(prompt.to_string()) or AIMessage(content="0.2 mg/kg"))
+    
+    history = [("What is the ivermectin dose for cows?", "0.2 mg/kg body weight")]
+    service.chat("and for a calf?", history)
+    assert queries == ["and for a calf? ivermectin dose cows"]
+    assert "0.2 mg/kg body weight" in prompts[0]
+
+
+def test_query_router_splits_lookups_and_reasoning():
+    """Test that confident lookups go fast and reasoning queries go to quality"""
+    from app.services.query_router import ROUTE_FAST, ROUTE_QUALITY, QueryRouter
+    
+    router = QueryRouter(min_terms_quality=12, confident_score=0.5)
+    confident = [(Document(page_content="Mastitis is udder inflammation"), 0.8)]
+    weak = [(Document(page_content="Housing should be dry"), 0.3)]
+    
+    assert router.route("What is mastitis?", confident) == ROUTE_FAST
+    assert router.route("What is mastitis?", weak) == ROUTE_QUALITY
+    assert router.route("Compare HF and Jersey cows for milk yield", confident) == ROUTE_QUALITY
+    assert router.route("What is mastitis? How is it treated?", confident) == ROUTE_QUALITY
+
+
+def test_quality_route_falls_back_to_fast_model(monkeypatch):
+    """Test that a failing quality model is replaced by the fast model"""
+    from langchain_core.messages import AIMessage
+    from app.core.exceptions import BackendUnavailableError
+    from app.services.chat_service import ChatService
+    from app.services.query_router import QueryRouter
+    from app.utils.metrics import metrics
+    
+    service = ChatService('testing')
+    service.router = QueryRouter()
+    monkeypatch.setattr(service, "_retrieve",
+                        lambda query: [(Document(page_content="Ration for cows"), 0.9)])
+    routes = []
+    
+    def fake_generate(prompt_value, route=None):
+        routes.append(route)
+        if route == "quality":
+            raise BackendUnavailableError("no quality backend")
+        return AIMessage(content="• Feed a balanced ration")
+    
+    monkeypatch.setattr(service, "_generate", fake_generate)
+    before = metrics.snapshot()["counters"].get("chat.route_fallbacks", 0)
+    
+    assert service.chat("Explain how to formulate a ration") == "• Feed a balanced ration"
+    assert routes == ["quality", "fast"]
+    assert metrics.snapshot()["counters"]["chat.route_fallbacks"] == before + 1
+
+
+def test_router_uses_retrieval_scores_when_reranking(monkeypatch):
+    """Test that weak retrieval still routes to the quality model after re-ranking"""
+    from langchain_core.messages import AIMessage
+    from app.services.chat_service import ChatService
+    from app.services.query_router import QueryRouter
+    from app.services.reranker import LexicalReranker
+    
+    service = ChatService('testing')
+    service.router = QueryRouter(confident_score=0.5)
+    monkeypatch.setattr(service.config, "RERANK_ENABLED", True)
+    monkeypatch.setattr(service.config, "RETRIEVAL_MIN_SCORE", 0.0)
+    texts = ["Mastitis is udder inflammation", "Calves need colostrum"]
+    monkeypatch.setattr(service, "_retrieve", lambda query: [
+        (Document(page_content=texts[0]), 0.05), (Document(page_content=texts[1]), 0.04),
+    ])
+    reranker = LexicalReranker(texts, weight=0.5)
+    monkeypatch.setattr(service, "_get_reranker", lambda: reranker)
+    routes = []
+    
+    def fake_generate(prompt_value, route=None):
+        routes.append(route)
+        return AIMessage(content="• Mastitis is udder inflammation")
+    
+    monkeypatch.setattr(service, "_generate", fake_generate)
+    service.chat("What is mastitis?")
+    assert routes == ["quality"]
+
+
+def test_latency_budget_bounds_the_whole_route(monkeypatch):
+    """Test that a slowly streaming quality model is cut off in time for the fallback"""
+    import time
+    from langchain_core.messages import AIMessageChunk
+    from app.core.exceptions import ChatServiceError
+    from app.services.backend_pool import BackendPool
+    from app.services.chat_service import ChatService
+    from app.services.query_router import QueryRouter
+    
+    class SlowLLM:
+        """Stalls stalls[route] seconds, then streams tokens[route] tokens, one every 50 ms"""
+        def __init__(self, route):
+            self.route = route
+        
+        def stream(self, prompt_value):
+            time.sleep(stalls[self.route])
+            for _ in range(tokens[self.route]):
+                time.sleep(0.05)
+                yield AIMessageChunk(content="word ")
+    
+    service = ChatService('testing')
+    service.router = QueryRouter()
+    monkeypatch.setattr(service.config, "QUALITY_LATENCY_BUDGET", 0.6)
+    monkeypatch.setattr(service.config, "FAST_LATENCY_BUDGET", 0.3)
+    monkeypatch.setattr(service, "_retrieve",
+                        lambda query: [(Document(page_content="Ration for cows"), 0.9)])
+    # A single failure would eject a backend
+    pools = {"fast": BackendPool(["http://fast"], failure_threshold=1),
+             "quality": BackendPool(["http://quality"], failure_threshold=1)}
+    tokens = {"fast": 2, "quality": 1000}
+    stalls = {"fast": 0, "quality": 0}
+    route_settings = service._route_settings
+    monkeypatch.setattr(service, "_route_settings",
+                        lambda route: {**route_settings(route), "pool": pools[route]})
+    monkeypatch.setattr(service, "_create_llm",
+                        lambda base_url, route=None: SlowLLM(route))
+    
+    started = time.monotonic()
+    assert service.chat("Explain how to formulate a ration") == "word word "
+    assert time.monotonic() - started < 0.6 + 0.1
+    
+    # Waiting for the first token counts against the budget too
+    stalls["quality"], tokens["quality"] = 2.0, 1
+    started = time.monotonic()
+    assert service.chat("Explain how to formulate a ration") == "word word "
+    assert time.monotonic() - started < 0.6 + 0.1
+    # Running out of budget is not held against the backend
+    assert pools["quality"].backends[0].ejected_until == 0.0
+    stalls["quality"], tokens["quality"] = 0, 1000
+    
+    # The fast route gets the time the quality model left, not a fresh budget
+    tokens["fast"] = 1000
+    started = time.monotonic()
+    with pytest.raises(ChatServiceError):
+        service.chat("Explain how to formulate a ration")
+    assert time.monotonic() - started < 0.6 + 0.1
+
+
+def test_request_journal_batches_and_rotates(tmp_path):
+    """Test that journal entries are written in batches and the file rotates"""
+    import json
+    from app.services.journal import RequestJournal
+    
+    path = tmp_path / "journal.jsonl"
+    journal = RequestJournal(str(path), batch_size=10, flush_interval=0.05,
+                             max_bytes=400, backup_count=2)
+    for i in range(30):
+        journal.record({"ts": i, "query": f"question {i}"})
+    journal.close()
+    
+    files = [path, tmp_path / "journal.jsonl.1", tmp_path / "journal.jsonl.2"]
+    assert all(f.exists() for f in files)
+    assert not (tmp_path / "journal.jsonl.3").exists()
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entries and entries[-1]["query"] == "question 29"
+    
+    journal.record({"ts": 30, "query": "after close"})
+    assert "after close" not in path.read_text()
+
+
+def test_replay_loads_journals_in_time_order(tmp_path):
+    """Test that replay merges worker journals by timestamp"""
+    from app.replay import load_entries, percentile
+    
+    (tmp_path / "a.jsonl").write_text('{"ts": 3, "query": "c"}\n{"ts": 1, "query": "a"}\n')
+    (tmp_path / "b.jsonl").write_text('{"ts": 2, "query": "b"}\nnot json\n{"ts": 4}\n')
+    
+    entries = load_entries([tmp_path / "a.jsonl", tmp_path / "b.jsonl"])
+    assert [e["query"] for e in entries] == ["a", "b", "c"]
+    assert len(load_entries([tmp_path / "a.jsonl"], limit=1)) == 1
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile([], 99) == 0.0
+
+
+def test_replay_sends_headers_and_reports_errors(monkeypatch, tmp_path, capsys):
+    """Test replay headers, non-JSON answers as errors and 429s reported separately"""
+    import json
+    import httpx
+    from app import replay as replay_module
+    
+    seen = []
+    
+    def handler(request):
+        seen.append((request.headers.get("X-API-Key"), request.headers.get("X-Test")))
+        if b'"broken"' in request.content:
+            return httpx.Response(200, text="<html>proxy error</html>")
+        if b'"throttled"' in request.content:
+            return httpx.Response(429, json={"error": "Rate limit exceeded"})
+        return httpx.Response(200, json={"answer": "ok"})
+    
+    client_class = httpx.Client
+    monkeypatch.setattr(replay_module.httpx, "Client",
+                        lambda **kwargs: client_class(transport=httpx.MockTransport(handler),
+                                                      **kwargs))
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text("".join(json.dumps({"ts": 0, "query": query}) + "\n"
+                               for query in ("broken", "throttled", "fine")))
+    
+    assert replay_module.main([str(journal), "--url", "http://test", "--speed", "0",
+                               "--api-key", "replay-key", "--header", "X-Test: 1"]) == 0
+    out = capsys.readouterr()
+    summary = json.loads(out.out)
+    assert summary["statuses"] == {"200": 1, "429": 1, "error": 1}
+    assert summary["rate_limited"] == 1
+    assert "rate limited" in out.err
+    assert seen == [("replay-key", "1")] * 3
+
+
+def test_chat_request_schema_validation():
+    """Test that request schemas strip queries and reject invalid fields"""
+    from pydantic import ValidationError
+    from app.models.schemas import ChatRequest, validation_message
+    
+    request = ChatRequest.model_validate_json('{"query": "  What is mastitis?  "}')
+    assert request.query == "What is mastitis?"
+    assert request.session_id is None
+    
+    for body, message in [('{"query": "   "}', "Query cannot be empty"),
+                          ('{"query": "ok", "session_id": 42}', "session_id"),
+                          ('{"query": "' + "a" * 1001 + '"}', "too long")]:
+        with pytest.raises(ValidationError) as excinfo:
+            ChatRequest.model_validate_json(body)
+        assert message in validation_message(excinfo.value)
+
+
+def test_fast_json_provider_matches_stdlib(app, monkeypatch):
+    """Test that orjson output decodes like the stdlib one, dates included"""
+    import dataclasses
+    import datetime
+    import uuid
+    from flask.json.provider import DefaultJSONProvider
+    pytest.importorskip('orjson')
+    
+    @dataclasses.dataclass
+    class Point:
+        x: int
+        when: datetime.datetime
+    
+    data = {"b": 1, "a": [1.5, "é", None], "id": uuid.UUID(int=1),
+            "when": datetime.date(2024, 1, 2),
+            "point": Point(1, datetime.datetime(2024, 1, 2, 3, 4, 5))}
+    stdlib = DefaultJSONProvider(app).dumps(data, separators=(',', ':'))
+    # The orjson path must not fall back to the stdlib encoder
+    monkeypatch.setattr(DefaultJSONProvider, 'dumps',
+                        lambda self, obj, **kwargs: pytest.fail("fell back to the stdlib"))
+    fast = app.json.dumps(data, separators=(',', ':'))
+    assert app.json.loads(fast) == app.json.loads(stdlib)
+    assert app.json.loads(fast)["when"] == "Tue, 02 Jan 2024 00:00:00 GMT"
+    assert app.json.loads(b'{"x": [1, 2]}') == {"x": [1, 2]}
+
+
+def test_fast_json_provider_falls_back_to_stdlib(app):
+    """Test that values orjson cannot encode faithfully use the stdlib encoder"""
+    from flask.json.provider import DefaultJSONProvider
+    
+    stdlib = DefaultJSONProvider(app)
+    for data in ({"big": 2 ** 70}, {"nan": float('nan'), "none": None},
+                 [None, {"inf": float('inf')}]):
+        assert app.json.dumps(data) == stdlib.dumps(data)
+    assert app.json.dumps({"none": None, "x": 1.5}) == '{"none":null,"x":1.5}'
+
+
+def test_rate_limit_keys_and_bucket_eviction():
+    """Test that unknown API keys share the address bucket and buckets are capped"""
+    from app.services.admission import (
+        AdmissionController, InMemoryRateLimitStore, RateLimitStore, client_key
+    )
+    
+    with pytest.raises(TypeError):
+        RateLimitStore()
+    
+    admission = AdmissionController(requests_per_minute=1, burst=1, max_in_flight=4,
+                                    max_in_flight_batch=1)
+    trusted = ["trusted"]
+    assert client_key("random-1", "10.0.0.1", trusted) == client_key("random-2", "10.0.0.1", trusted)
+    assert client_key("trusted", "10.0.0.1", trusted) == "key:trusted"
+    assert admission.check_rate(client_key("random-1", "10.0.0.1", trusted))[0]
+    assert not admission.check_rate(client_key("random-2", "10.0.0.1", trusted))[0]
+    
+    store = InMemoryRateLimitStore(max_keys=3)
+    for i in range(10):
+        store.consume(f"client-{i}", rate=0.001, burst=1)
+    assert list(store._buckets) == ["client-7", "client-8", "client-9"]
+    store.consume("client-7", rate=0.001, burst=1)
+    store.consume("client-10", rate=0.001, burst=1)
+    assert list(store._buckets) == ["client-9", "client-7", "client-10"]
+    
+    with pytest.raises(ValueError):
+        AdmissionController(requests_per_minute=0, burst=1, max_in_flight=4,
+                            max_in_flight_batch=1)